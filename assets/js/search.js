@@ -0,0 +1,136 @@
+/*
+	Поиск по индексу, собранному notion_converter/search_index.py.
+	Загружает manifest.json, а затем только шарды термов запроса и чанки найденных документов.
+*/
+(function() {
+
+	var form = document.getElementById('search-form');
+	if (!form || !window.fetch)
+		return;
+
+	var input = form.querySelector('input[name="query"]'),
+		output = document.getElementById('search-results'),
+		base = form.getAttribute('data-index').replace(/manifest\.json$/, ''),
+		cache = {},
+		manifest = null,
+		maxResults = 10,
+		tokenRe = /[\p{L}\p{N}]+/gu;
+
+	function load(path) {
+		if (!cache[path])
+			cache[path] = fetch(base + path).then(function(response) {
+				if (!response.ok)
+					throw new Error(response.status);
+				return response.json();
+			});
+		return cache[path];
+	}
+
+	function stem(word) {
+		for (var i = 0; i < manifest.suffixes.length; i++) {
+			var suffix = manifest.suffixes[i];
+			if (word.length - suffix.length >= manifest.min_stem_length && word.slice(-suffix.length) === suffix)
+				return word.slice(0, -suffix.length);
+		}
+		return word;
+	}
+
+	// Та же нормализация, что и tokenize() на стороне сборки
+	function tokenize(text) {
+		var words = text.toLowerCase().replace(/ё/g, 'е').match(tokenRe) || [];
+		return words.filter(function(word) {
+			return word.length >= manifest.min_token_length && manifest.stop_words.indexOf(word) < 0;
+		}).map(stem);
+	}
+
+	function shardKey(term) {
+		var bytes = new TextEncoder().encode(Array.from(term).slice(0, manifest.prefix_length).join('')),
+			hex = '';
+		for (var i = 0; i < bytes.length; i++)
+			hex += ('0' + bytes[i].toString(16)).slice(-2);
+		return hex;
+	}
+
+	// Веса документов для терма; последний терм запроса ищется ещё и как префикс
+	function lookup(term, prefix) {
+		var shard = manifest.shards[shardKey(term)];
+		if (!shard)
+			return Promise.resolve({});
+		return load(shard).then(function(terms) {
+			var scores = {};
+			Object.keys(terms).forEach(function(candidate) {
+				if (candidate !== term && !(prefix && candidate.indexOf(term) === 0))
+					return;
+				var postings = terms[candidate];
+				for (var i = 0; i < postings.length; i += 2)
+					scores[postings[i]] = Math.max(scores[postings[i]] || 0, postings[i + 1]);
+			});
+			return scores;
+		});
+	}
+
+	function search(query) {
+		var terms = tokenize(query);
+		if (!terms.length)
+			return Promise.resolve([]);
+		return Promise.all(terms.map(function(term, index) {
+			return lookup(term, index === terms.length - 1);
+		})).then(function(results) {
+			// Документ должен содержать все термы запроса
+			var totals = results[0];
+			results.slice(1).forEach(function(scores) {
+				var merged = {};
+				Object.keys(totals).forEach(function(id) {
+					if (id in scores)
+						merged[id] = totals[id] + scores[id];
+				});
+				totals = merged;
+			});
+			var ids = Object.keys(totals).sort(function(a, b) {
+				return totals[b] - totals[a] || a - b;
+			}).slice(0, maxResults);
+			return Promise.all(ids.map(function(id) {
+				return load(manifest.docs[Math.floor(id / manifest.docs_per_chunk)]).then(function(chunk) {
+					return chunk[id % manifest.docs_per_chunk];
+				});
+			}));
+		});
+	}
+
+	function render(docs) {
+		output.innerHTML = '';
+		docs.forEach(function(doc) {
+			var item = document.createElement('li'),
+				link = document.createElement('a');
+			link.href = doc[0];
+			link.textContent = doc[1];
+			item.appendChild(link);
+			output.appendChild(item);
+		});
+	}
+
+	var pending = 0;
+
+	function update() {
+		var current = ++pending,
+			query = input.value;
+		(manifest ? Promise.resolve(manifest) : load('manifest.json')).then(function(data) {
+			manifest = data;
+			return search(query);
+		}).then(function(docs) {
+			// Ответ на устаревший запрос не должен перетирать свежий
+			if (current === pending)
+				render(docs);
+		}).catch(function() {
+			if (current === pending)
+				render([]);
+		});
+	}
+
+	input.addEventListener('input', update);
+	form.addEventListener('submit', function(event) {
+		event.preventDefault();
+		update();
+	});
+
+})();
@@ -0,0 +1,137 @@
+"""Локальная замена API прямой загрузки Cloudflare Pages для проверки notion_converter/deploy.py"""
+import re
+import json
+import threading
+from collections import Counter
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import List, Dict, Any, Optional
+
+
+class MockPagesServer:
+    """Хранилище блобов по хэшу и список деплоев; эндпоинты под префиксом /client/v4"""
+
+    def __init__(self, api_token: str = 'token', account_id: str = 'account', project: str = 'site',
+                 fail_uploads: int = 0):
+        self.api_token = api_token
+        self.account_id = account_id
+        self.project = project
+        # Сколько первых запросов upload завершить ошибкой 503 (проверка повторов)
+        self.fail_uploads = fail_uploads
+        self.assets: Dict[str, Dict[str, Any]] = {}
+        self.deployments: List[Dict[str, Any]] = []
+        self.requests = Counter()
+        self.uploaded_bytes = 0
+        self.jwt_counter = 0
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), self.make_handler())
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/client/v4"
+
+    def start(self) -> 'MockPagesServer':
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def make_handler(self):
+        mock = self
+        project_path = f"/client/v4/accounts/{mock.account_id}/pages/projects/{mock.project}"
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def send_json(self, status: int, result: Any = None, errors: Optional[List[str]] = None):
+                body = json.dumps({'success': status < 400, 'errors': errors or [], 'messages': [],
+                                   'result': result}).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def token(self) -> str:
+                return (self.headers.get('Authorization') or '').replace('Bearer ', '', 1)
+
+            def has_jwt(self) -> bool:
+                return self.token().startswith('jwt-')
+
+            def do_GET(self):
+                with mock.lock:
+                    mock.requests['upload-token'] += 1
+                if self.path != f"{project_path}/upload-token":
+                    return self.send_json(404, errors=['not found'])
+                if self.token() != mock.api_token:
+                    return self.send_json(403, errors=['bad api token'])
+                with mock.lock:
+                    mock.jwt_counter += 1
+                    jwt = f"jwt-{mock.jwt_counter}"
+                self.send_json(200, {'jwt': jwt})
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+                if self.path == f"{project_path}/deployments":
+                    return self.deployment(body)
+                match = re.fullmatch(r'/client/v4/pages/assets/(check-missing|upload|upsert-hashes)', self.path)
+                if not match:
+                    return self.send_json(404, errors=['not found'])
+                kind = match.group(1)
+                with mock.lock:
+                    mock.requests[kind] += 1
+                    fail = kind == 'upload' and mock.fail_uploads > 0
+                    if fail:
+                        mock.fail_uploads -= 1
+                if not self.has_jwt():
+                    return self.send_json(401, errors=['upload jwt required'])
+                if fail:
+                    return self.send_json(503, errors=['temporarily unavailable'])
+
+                payload = json.loads(body)
+                if kind == 'check-missing':
+                    return self.send_json(200, [h for h in payload['hashes'] if h not in mock.assets])
+                if kind == 'upload':
+                    with mock.lock:
+                        for item in payload:
+                            mock.assets[item['key']] = item['metadata']
+                            mock.uploaded_bytes += len(item['value'])
+                    return self.send_json(200, {'successful_key_count': len(payload)})
+                self.send_json(200, None)
+
+            def deployment(self, body: bytes):
+                with mock.lock:
+                    mock.requests['deployments'] += 1
+                if self.token() != mock.api_token:
+                    return self.send_json(403, errors=['bad api token'])
+                message = BytesParser(policy=HTTP).parsebytes(
+                    f"Content-Type: {self.headers.get('Content-Type')}\r\n\r\n".encode('utf-8') + body)
+                fields = {part.get_param('name', header='content-disposition'): part.get_payload(decode=True)
+                          for part in message.iter_parts()}
+                manifest = json.loads(fields['manifest'])
+                missing = [path for path, file_hash in manifest.items() if file_hash not in mock.assets]
+                if missing:
+                    return self.send_json(400, errors=[f"missing assets: {missing[:5]}"])
+                with mock.lock:
+                    deployment = {'id': str(len(mock.deployments) + 1), 'manifest': manifest,
+                                  'files': {name: value for name, value in fields.items() if name != 'manifest'},
+                                  'url': f"https://{len(mock.deployments) + 1}.{mock.project}.pages.dev"}
+                    mock.deployments.append(deployment)
+                self.send_json(200, {'id': deployment['id'], 'url': deployment['url']})
+
+        return Handler
@@ -0,0 +1,374 @@
+"""Локальная замена Notion API и генератор синтетических рабочих пространств для бенчмарков"""
+import re
+import json
+import time
+import random
+import threading
+from collections import Counter
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+from typing import List, Dict, Any, Optional, Tuple
+
+EDITED_TIME = "2024-01-01T00:00:00.000Z"
+
+# Доли типов блоков в синтетических страницах
+DEFAULT_BLOCK_MIX = {
+    'paragraph': 40,
+    'heading_1': 3,
+    'heading_2': 4,
+    'heading_3': 4,
+    'bulleted_list_item': 12,
+    'numbered_list_item': 8,
+    'to_do': 4,
+    'quote': 3,
+    'callout': 3,
+    'code': 6,
+    'toggle': 5,
+    'table': 2,
+    'divider': 2,
+    'image': 2,
+    'bookmark': 2,
+}
+# Типы, которые получают дочерние блоки при depth > 1
+NESTING_TYPES = {'toggle', 'bulleted_list_item', 'numbered_list_item', 'callout', 'quote'}
+
+WORDS = ("notion cloudflare page build render fetch cache block tree token bucket "
+         "index search template stream asset image table column toggle quote").split()
+
+
+def rich_text(text: str, **annotations) -> List[Dict[str, Any]]:
+    return [{
+        "type": "text",
+        "text": {"content": text, "link": None},
+        "annotations": {"bold": False, "italic": False, "strikethrough": False,
+                        "underline": False, "code": False, "color": "default", **annotations},
+        "plain_text": text,
+        "href": None,
+    }]
+
+
+class Workspace:
+    """Синтетическое рабочее пространство: страницы и дочерние блоки по id"""
+
+    def __init__(self, pages: int = 10, blocks_per_page: int = 200, depth: int = 2,
+                 children_per_block: int = 5, code_size: int = 2000,
+                 block_mix: Optional[Dict[str, int]] = None, seed: int = 42,
+                 fanout: int = 0, database_pages: int = 0):
+        self.random = random.Random(seed)
+        self.block_mix = block_mix or DEFAULT_BLOCK_MIX
+        self.children_per_block = children_per_block
+        self.code_size = code_size
+        self.media_base_url = ''
+        self.pages: Dict[str, Dict[str, Any]] = {}
+        self.children: Dict[str, List[Dict[str, Any]]] = {}
+        self.databases: Dict[str, List[Dict[str, Any]]] = {}
+        self.counter = 0
+        self.block_count = 0
+
+        for page_index in range(pages):
+            page_id = self.new_id()
+            self.pages[page_id] = {
+                "object": "page",
+                "id": page_id,
+                "last_edited_time": EDITED_TIME,
+                "properties": {"title": {"id": "title", "type": "title",
+                                         "title": rich_text(f"Page {page_index + 1}")}},
+            }
+            self.children[page_id] = [self.make_block(depth) for _ in range(blocks_per_page)]
+
+        if fanout:
+            self.link_pages(fanout, database_pages)
+
+    @property
+    def page_ids(self) -> List[str]:
+        return list(self.pages)
+
+    def link_pages(self, fanout: int, database_pages: int):
+        """Связывает страницы в дерево child_page с корнем в первой странице.
+
+        Последние database_pages страниц доступны только через базу данных на корневой странице.
+        Каждая страница дополнительно ссылается на корень, чтобы обход встречал циклы.
+        """
+        page_ids = self.page_ids
+        linked = page_ids[:len(page_ids) - database_pages]
+        for index, page_id in enumerate(linked[1:], start=1):
+            parent_id = linked[(index - 1) // fanout]
+            self.children[parent_id].append(self.link_block('child_page', page_id))
+            self.children[page_id].append(self.link_block('child_page', page_ids[0]))
+        if database_pages:
+            database_id = self.new_id()
+            self.databases[database_id] = [self.pages[page_id] for page_id in page_ids[-database_pages:]]
+            self.children[page_ids[0]].append(self.link_block('child_database', database_id))
+
+    def edit_page(self, page_id: str, edited_time: str, title: Optional[str] = None):
+        """Имитирует правку: новый абзац в конце страницы и, при необходимости, новый заголовок"""
+        page = self.pages[page_id]
+        page["last_edited_time"] = edited_time
+        if title is not None:
+            page["properties"]["title"]["title"] = rich_text(title)
+        block = self.make_block(1)
+        block["last_edited_time"] = edited_time
+        self.children[page_id].append(block)
+
+    def edit_nested_block(self, page_id: str, edited_time: str) -> Optional[str]:
+        """Имитирует правку текста во вложенном блоке (toggle, список, callout).
+
+        Как в Notion, меняется last_edited_time самого блока и страницы, но не родительского блока.
+        Возвращает новый текст или None, если на странице нет вложенных блоков с текстом.
+        """
+        stack = list(reversed(self.children[page_id]))
+        while stack:
+            parent = stack.pop()
+            for child in self.children.get(parent["id"], []) if parent["type"] in NESTING_TYPES else []:
+                data = child[child["type"]]
+                if "rich_text" in data:
+                    text = f"edited {edited_time}"
+                    data["rich_text"] = rich_text(text)
+                    child["last_edited_time"] = edited_time
+                    self.pages[page_id]["last_edited_time"] = edited_time
+                    return text
+            stack.extend(reversed(self.children.get(parent["id"], [])))
+        return None
+
+    def find_block(self, block_id: str) -> Optional[Dict[str, Any]]:
+        for blocks in self.children.values():
+            for block in blocks:
+                if block["id"] == block_id:
+                    return block
+        return None
+
+    def link_block(self, block_type: str, object_id: str) -> Dict[str, Any]:
+        title = self.pages[object_id]['properties']['title']['title'][0]['plain_text'] \
+            if object_id in self.pages else 'Database'
+        return {"object": "block", "id": object_id, "type": block_type, "has_children": True,
+                "last_edited_time": EDITED_TIME, block_type: {"title": title}}
+
+    def new_id(self) -> str:
+        self.counter += 1
+        return f"{self.counter:08x}-0000-4000-8000-{self.random.getrandbits(48):012x}"
+
+    def sentence(self, words: int = 12) -> str:
+        return ' '.join(self.random.choice(WORDS) for _ in range(words))
+
+    def make_block(self, depth: int) -> Dict[str, Any]:
+        block_type = self.random.choices(list(self.block_mix), weights=list(self.block_mix.values()))[0]
+        block_id = self.new_id()
+        self.block_count += 1
+        block = {"object": "block", "id": block_id, "type": block_type, "has_children": False,
+                 "last_edited_time": EDITED_TIME, block_type: self.block_data(block_type)}
+
+        children = []
+        if block_type == 'table':
+            children = [self.table_row(3) for _ in range(4)]
+        elif block_type in NESTING_TYPES and depth > 1 and self.random.random() < 0.3:
+            children = [self.make_block(depth - 1) for _ in range(self.children_per_block)]
+        if children:
+            block["has_children"] = True
+            self.children[block_id] = children
+        return block
+
+    def block_data(self, block_type: str) -> Dict[str, Any]:
+        if block_type == 'code':
+            lines = []
+            while sum(len(line) + 1 for line in lines) < self.code_size:
+                lines.append(f"    value = compute({self.random.randint(0, 999)}) < limit  # {self.sentence(4)}")
+            return {"rich_text": rich_text('\n'.join(lines)), "language": "python", "caption": []}
+        if block_type == 'image':
+            number = self.random.randint(0, 9)
+            if number % 2:
+                # Загруженный в Notion файл: подписанная ссылка и срок её действия выдаются при каждом ответе
+                return {"type": "file", "caption": [],
+                        "file": {"url": f"{{media}}/image-{number}.png?signature={{expiry}}",
+                                 "expiry_time": "{expiry}"}}
+            return {"type": "external", "external": {"url": f"{{media}}/image-{number}.png"}, "caption": []}
+        if block_type == 'bookmark':
+            return {"url": "https://example.com/", "caption": []}
+        if block_type == 'table':
+            return {"table_width": 3, "has_column_header": True, "has_row_header": False}
+        if block_type == 'divider':
+            return {}
+        data = {"rich_text": rich_text(self.sentence(), bold=self.random.random() < 0.1), "color": "default"}
+        if block_type == 'to_do':
+            data["checked"] = self.random.random() < 0.5
+        if block_type == 'callout':
+            data["icon"] = {"type": "emoji", "emoji": "💡"}
+        return data
+
+    def table_row(self, width: int) -> Dict[str, Any]:
+        self.block_count += 1
+        return {"object": "block", "id": self.new_id(), "type": "table_row", "has_children": False,
+                "last_edited_time": EDITED_TIME,
+                "table_row": {"cells": [rich_text(self.sentence(2)) for _ in range(width)]}}
+
+
+class MockNotionServer:
+    """HTTP-сервер с эндпоинтами pages, blocks, blocks/children, databases/query и search Notion API"""
+
+    def __init__(self, workspace: Workspace, latency: float = 0.0, rate_limit_every: int = 0,
+                 retry_after: float = 0.1):
+        self.workspace = workspace
+        self.latency = latency
+        self.rate_limit_every = rate_limit_every
+        self.retry_after = retry_after
+        self.requests = Counter()
+        # (время, событие): приход запроса к API и отправка ответа 429 — для проверки пауз клиента
+        self.events: List[Tuple[float, str]] = []
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), self.make_handler())
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> 'MockNotionServer':
+        self.workspace.media_base_url = f"{self.url}/media"
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def count(self, kind: str) -> int:
+        with self.lock:
+            self.requests[kind] += 1
+            if kind != 'rate_limited':
+                self.events.append((time.monotonic(), 'request'))
+            return sum(self.requests[key] for key in ('pages', 'blocks', 'children', 'databases', 'search'))
+
+    def make_handler(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def send_json(self, status: int, payload: Any, headers: Optional[Dict[str, str]] = None):
+                expiry = time.strftime('%Y-%m-%dT%H:%M:%S.000Z', time.gmtime(time.time() + 3600))
+                body = json.dumps(payload).replace('{media}', mock.workspace.media_base_url) \
+                    .replace('{expiry}', expiry).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                parts = urlsplit(self.path)
+                if parts.path.startswith('/media/'):
+                    return self.send_media()
+                if mock.latency:
+                    time.sleep(mock.latency)
+
+                match = re.fullmatch(r'/v1/blocks/([^/]+)/children', parts.path)
+                if match:
+                    total = mock.count('children')
+                    if self.rate_limited(total):
+                        return
+                    return self.send_children(match.group(1), parse_qs(parts.query))
+
+                match = re.fullmatch(r'/v1/blocks/([^/]+)', parts.path)
+                if match:
+                    total = mock.count('blocks')
+                    if self.rate_limited(total):
+                        return
+                    block = mock.workspace.find_block(match.group(1))
+                    if block is None:
+                        return self.send_json(404, {"object": "error", "code": "object_not_found"})
+                    return self.send_json(200, block)
+
+                match = re.fullmatch(r'/v1/pages/([^/]+)', parts.path)
+                if match:
+                    total = mock.count('pages')
+                    if self.rate_limited(total):
+                        return
+                    page = mock.workspace.pages.get(match.group(1))
+                    if page is None:
+                        return self.send_json(404, {"object": "error", "code": "object_not_found"})
+                    return self.send_json(200, page)
+
+                self.send_json(404, {"object": "error", "code": "invalid_request_url"})
+
+            def do_POST(self):
+                parts = urlsplit(self.path)
+                body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+                if mock.latency:
+                    time.sleep(mock.latency)
+
+                match = re.fullmatch(r'/v1/databases/([^/]+)/query', parts.path)
+                if match:
+                    total = mock.count('databases')
+                    if self.rate_limited(total):
+                        return
+                    pages = mock.workspace.databases.get(match.group(1))
+                    if pages is None:
+                        return self.send_json(404, {"object": "error", "code": "object_not_found"})
+                    query = json.loads(body or b'{}')
+                    start = int(query.get('start_cursor') or 0)
+                    page_size = min(100, int(query.get('page_size', 100)))
+                    has_more = start + page_size < len(pages)
+                    return self.send_json(200, {"object": "list", "results": pages[start:start + page_size],
+                                                "has_more": has_more,
+                                                "next_cursor": str(start + page_size) if has_more else None})
+
+                if parts.path == '/v1/search':
+                    total = mock.count('search')
+                    if self.rate_limited(total):
+                        return
+                    query = json.loads(body or b'{}')
+                    pages = sorted(mock.workspace.pages.values(), key=lambda page: page["last_edited_time"],
+                                   reverse=True)
+                    start = int(query.get('start_cursor') or 0)
+                    page_size = min(100, int(query.get('page_size', 100)))
+                    has_more = start + page_size < len(pages)
+                    return self.send_json(200, {"object": "list", "results": pages[start:start + page_size],
+                                                "has_more": has_more,
+                                                "next_cursor": str(start + page_size) if has_more else None})
+
+                self.send_json(404, {"object": "error", "code": "invalid_request_url"})
+
+            def rate_limited(self, total: int) -> bool:
+                if mock.rate_limit_every and total % mock.rate_limit_every == 0:
+                    mock.count('rate_limited')
+                    self.send_json(429, {"object": "error", "code": "rate_limited"},
+                                   {'Retry-After': str(mock.retry_after)})
+                    with mock.lock:
+                        mock.events.append((time.monotonic(), 'rate_limited'))
+                    return True
+                return False
+
+            def send_children(self, block_id: str, query: Dict[str, List[str]]):
+                children = mock.workspace.children.get(block_id, [])
+                start = int(query.get('start_cursor', ['0'])[0])
+                page_size = min(100, int(query.get('page_size', ['100'])[0]))
+                results = children[start:start + page_size]
+                has_more = start + page_size < len(children)
+                self.send_json(200, {"object": "list", "results": results, "has_more": has_more,
+                                     "next_cursor": str(start + page_size) if has_more else None})
+
+            def send_media(self):
+                mock.count('media')
+                # Минимальный валидный PNG 1x1
+                body = bytes.fromhex(
+                    '89504e470d0a1a0a0000000d4948445200000001000000010806000000'
+                    '1f15c4890000000d49444154789c6360000002000100e221bc330000000049454e44ae426082')
+                self.send_response(200)
+                self.send_header('Content-Type', 'image/png')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
@@ -0,0 +1,189 @@
+"""Сквозной бенчмарк notion_converter/main.py на локальной замене Notion API.
+
+Пример:
+    python benchmarks/run_benchmark.py --pages 40 --blocks 300 --depth 3 --latency 0.05 --runs 2
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+import subprocess
+import tempfile
+from pathlib import Path
+from typing import Dict, Any
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT / 'notion_converter'))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from deploy import PagesDeployer
+from mock_notion import Workspace, MockNotionServer
+from mock_cloudflare import MockPagesServer
+
+
+# Сборка в дочернем процессе. ru_maxrss после fork+exec учитывает и память родителя
+# (замены API с workspace), поэтому пик берётся из VmHWM — он считается для нового адресного пространства.
+BUILD_RUNNER = '''
+import os, sys, runpy, resource
+main_path, rss_path = sys.argv[1:3]
+sys.path.insert(0, os.path.dirname(main_path))
+try:
+    runpy.run_path(main_path, run_name='__main__')
+finally:
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if os.path.exists('/proc/self/status'):
+        with open('/proc/self/status') as f:
+            peak_kb = next(int(line.split()[1]) for line in f if line.startswith('VmHWM:'))
+    with open(rss_path, 'w') as f:
+        f.write(str(peak_kb))
+'''
+
+
+def prepare_site_dir(work_dir: Path):
+    """Рабочая директория со ссылками на шаблоны и assets репозитория"""
+    work_dir.mkdir(parents=True, exist_ok=True)
+    for name in ('templates', 'config', 'assets'):
+        link = work_dir / name
+        if not link.exists():
+            link.symlink_to(REPO_ROOT / name, target_is_directory=True)
+
+
+def run_once(server: MockNotionServer, work_dir: Path) -> Dict[str, Any]:
+    """Запускает сборку в дочернем процессе: его пиковая память не включает замену API и workspace"""
+    requests_before = dict(server.requests)
+    log_path = work_dir / 'build.log'
+    rss_path = work_dir / 'build-rss-kb'
+    started = time.perf_counter()
+    with open(log_path, 'w', encoding='utf-8') as log:
+        returncode = subprocess.call(
+            [sys.executable, '-c', BUILD_RUNNER, str(REPO_ROOT / 'notion_converter' / 'main.py'), str(rss_path)],
+            cwd=work_dir, stdout=log, stderr=subprocess.STDOUT)
+    total = time.perf_counter() - started
+    if returncode:
+        raise RuntimeError(f"Build failed with exit code {returncode}, see {log_path}")
+    report = json.loads((work_dir / 'sync-metrics.json').read_text(encoding='utf-8'))
+
+    return {
+        'total_seconds': round(total, 4),
+        'phases_seconds': {name: span['seconds'] for name, span in report['spans'].items()},
+        'notion_request_seconds': report['histograms'].get('notion.request_seconds'),
+        'requests': {kind: count - requests_before.get(kind, 0) for kind, count in server.requests.items()},
+        'peak_rss_mb': round(int(rss_path.read_text()) / 1024, 1),
+    }
+
+
+def deploy_once(pages_server: MockPagesServer, work_dir: Path) -> Dict[str, Any]:
+    """Дифференциальный деплой build на локальную замену Cloudflare Pages"""
+    requests_before = dict(pages_server.requests)
+    bytes_before = pages_server.uploaded_bytes
+    deployer = PagesDeployer(pages_server.api_token, pages_server.account_id, pages_server.project,
+                             build_dir=str(work_dir / 'build'),
+                             manifest_path=str(work_dir / '.notion_cache' / 'deploy-manifest.json'),
+                             base_url=pages_server.base_url)
+    started = time.perf_counter()
+    try:
+        deployer.deploy()
+    finally:
+        deployer.close()
+    return {
+        'seconds': round(time.perf_counter() - started, 4),
+        'stats': deployer.stats,
+        'requests': {kind: count - requests_before.get(kind, 0) for kind, count in pages_server.requests.items()},
+        'uploaded_base64_bytes': pages_server.uploaded_bytes - bytes_before,
+    }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--pages', type=int, default=10)
+    parser.add_argument('--blocks', type=int, default=200, help='блоков верхнего уровня на страницу')
+    parser.add_argument('--depth', type=int, default=2, help='глубина вложенности блоков')
+    parser.add_argument('--children', type=int, default=5, help='дочерних блоков у вложенного блока')
+    parser.add_argument('--code-size', type=int, default=2000, help='размер блока кода в символах')
+    parser.add_argument('--latency', type=float, default=0.0, help='задержка ответа API в секундах')
+    parser.add_argument('--rate-limit-every', type=int, default=0, help='отвечать 429 на каждый N-й запрос')
+    parser.add_argument('--retry-after', type=float, default=0.1)
+    parser.add_argument('--requests-per-second', type=float, default=1000.0,
+                        help='лимит NotionClient (по умолчанию практически без ограничения)')
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--runs', type=int, default=1, help='повторные запуски измеряют работу с тёплым кэшем')
+    parser.add_argument('--stream', action='store_true', help='NOTION_STREAM_OUTPUT=1')
+    parser.add_argument('--render-processes', type=int, default=0, help='NOTION_RENDER_PROCESSES')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--discover', type=int, default=0, metavar='FANOUT',
+                        help='связать страницы деревом child_page и обходить его от корня (NOTION_ROOT_IDS)')
+    parser.add_argument('--database-pages', type=int, default=0,
+                        help='страниц, доступных только через базу данных (вместе с --discover)')
+    parser.add_argument('--output', help='куда сохранить JSON-отчёт')
+    parser.add_argument('--keep', action='store_true', help='не удалять рабочую директорию')
+    parser.add_argument('--deploy', action='store_true',
+                        help='после каждого запуска деплоить build на локальную замену Cloudflare Pages')
+    parser.add_argument('--edit-pages', type=int, default=0,
+                        help='перед каждым повторным запуском править столько страниц')
+    parser.add_argument('--edit-nested', action='store_true',
+                        help='править текст вложенного блока вместо добавления абзаца (вместе с --edit-pages)')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    workspace = Workspace(pages=args.pages, blocks_per_page=args.blocks, depth=args.depth,
+                          children_per_block=args.children, code_size=args.code_size, seed=args.seed,
+                          fanout=args.discover, database_pages=args.database_pages)
+    work_dir = Path(tempfile.mkdtemp(prefix='notion-bench-'))
+    prepare_site_dir(work_dir)
+
+    report = {
+        'workspace': {'pages': args.pages, 'blocks': workspace.block_count, 'depth': args.depth},
+        'runs': [],
+    }
+    try:
+        with MockNotionServer(workspace, latency=args.latency, rate_limit_every=args.rate_limit_every,
+                              retry_after=args.retry_after) as server:
+            os.environ.update({
+                'NOTION_API_TOKEN': 'benchmark',
+                'NOTION_PAGE_IDS': '' if args.discover else ','.join(workspace.page_ids),
+                'NOTION_ROOT_IDS': workspace.page_ids[0] if args.discover else '',
+                'NOTION_API_BASE_URL': f"{server.url}/v1",
+                'NOTION_MAX_WORKERS': str(args.workers),
+                'NOTION_REQUESTS_PER_SECOND': str(args.requests_per_second),
+                'NOTION_CACHE_DIR': str(work_dir / '.notion_cache'),
+                'NOTION_STREAM_OUTPUT': '1' if args.stream else '',
+                'NOTION_RENDER_PROCESSES': str(args.render_processes),
+                'NOTION_METRICS_PATH': str(work_dir / 'sync-metrics.json'),
+            })
+            with MockPagesServer() as pages_server:
+                for run in range(args.runs):
+                    edited_texts = []
+                    if run and args.edit_pages:
+                        for page_id in workspace.page_ids[:args.edit_pages]:
+                            edited_time = f"2024-01-01T00:{run:02d}:00.000Z"
+                            if args.edit_nested:
+                                edited_texts.append(workspace.edit_nested_block(page_id, edited_time))
+                            else:
+                                workspace.edit_page(page_id, edited_time)
+                    result = run_once(server, work_dir)
+                    if args.edit_nested:
+                        # Правки вложенных блоков, которые не попали в build (устаревший кэш)
+                        html = ''.join(path.read_text(encoding='utf-8') for path in (work_dir / 'build').glob('*.html'))
+                        result['stale_edits'] = sum(1 for text in edited_texts if text and text not in html)
+                    if args.deploy:
+                        result['deploy'] = deploy_once(pages_server, work_dir)
+                    report['runs'].append(result)
+    finally:
+        if not args.keep:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(text, encoding='utf-8')
+    print(text)
+
+
+if __name__ == '__main__':
+    main()
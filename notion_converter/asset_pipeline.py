@@ -0,0 +1,131 @@
+import re
+import gzip
+import hashlib
+import logging
+import posixpath
+from pathlib import Path
+from typing import Dict, List
+
+try:
+    import rcssmin
+except ImportError:  # минификаторы необязательны: без них файлы только фингерпринтятся
+    rcssmin = None
+try:
+    import rjsmin
+except ImportError:
+    rjsmin = None
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+from file_manager import FileManager, IGNORED_ASSETS
+
+CSS_URL_RE = re.compile(r'url\(\s*([\'"]?)([^\'")]+)\1\s*\)')
+PRECOMPRESS_EXTENSIONS = {'.html', '.css', '.js', '.svg', '.json', '.txt', '.xml'}
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+
+class AssetPipeline:
+    """Минифицирует и фингерпринтит assets, пишет _headers для Cloudflare Pages"""
+
+    def __init__(self, assets_dir: str = 'assets'):
+        self.assets_dir = Path(assets_dir)
+        # 'assets/css/main.css' -> 'assets/css/main.1a2b3c4d.css'
+        self.asset_urls: Dict[str, str] = {}
+
+    @staticmethod
+    def fingerprint(rel_path: str, data: bytes) -> str:
+        stem, extension = posixpath.splitext(rel_path)
+        return f"{stem}.{hashlib.sha256(data).hexdigest()[:8]}{extension}"
+
+    def build(self, file_manager: FileManager) -> Dict[str, str]:
+        """Обрабатывает все assets и кладёт их в build под хэшированными именами"""
+        sources = {}
+        for path in sorted(self.assets_dir.rglob('*')):
+            rel_path = path.relative_to(self.assets_dir.parent)
+            if path.is_file() and rel_path.parts[1] not in IGNORED_ASSETS:
+                sources[rel_path.as_posix()] = path
+
+        # CSS ссылается на шрифты и другие CSS, поэтому обрабатывается после них
+        pending_css = {}
+        for rel_path, path in sources.items():
+            if rel_path.endswith('.css'):
+                pending_css[rel_path] = path.read_text(encoding='utf-8')
+            elif rel_path.endswith('.js'):
+                self.emit(file_manager, rel_path, self.minify_js(rel_path, path.read_text(encoding='utf-8')))
+            else:
+                self.emit(file_manager, rel_path, path.read_bytes())
+
+        while pending_css:
+            ready = [rel_path for rel_path, css in pending_css.items()
+                     if not any(ref in pending_css for ref in self.css_references(rel_path, css))]
+            # Циклические @import разрываем, обрабатывая оставшиеся файлы как есть
+            for rel_path in ready or list(pending_css):
+                css = self.rewrite_css_urls(rel_path, pending_css.pop(rel_path))
+                self.emit(file_manager, rel_path, self.minify_css(css))
+
+        logging.info(f"Processed {len(self.asset_urls)} assets")
+        return self.asset_urls
+
+    def emit(self, file_manager: FileManager, rel_path: str, data):
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        hashed_path = self.fingerprint(rel_path, data)
+        file_manager.save_bytes(hashed_path, data)
+        self.asset_urls[rel_path] = hashed_path
+
+    @staticmethod
+    def resolve(css_path: str, url: str) -> str:
+        return posixpath.normpath(posixpath.join(posixpath.dirname(css_path), url))
+
+    def css_references(self, css_path: str, css: str) -> List[str]:
+        return [self.resolve(css_path, re.split(r'[?#]', match.group(2), 1)[0])
+                for match in CSS_URL_RE.finditer(css)
+                if not re.match(r'^(?:[a-z]+:|//|/)', match.group(2))]
+
+    def rewrite_css_urls(self, css_path: str, css: str) -> str:
+        """Заменяет относительные url(...) на фингерпринтнутые имена"""
+        def replace(match):
+            quote, url = match.groups()
+            if re.match(r'^(?:[a-z]+:|//|/)', url):
+                return match.group(0)
+            path, suffix = re.match(r'^([^?#]*)(.*)$', url).groups()
+            hashed = self.asset_urls.get(self.resolve(css_path, path))
+            if not hashed:
+                return match.group(0)
+            new_url = posixpath.relpath(hashed, posixpath.dirname(css_path)) + suffix
+            return f"url({quote}{new_url}{quote})"
+        return CSS_URL_RE.sub(replace, css)
+
+    @staticmethod
+    def minify_css(css: str) -> str:
+        return rcssmin.cssmin(css) if rcssmin else css
+
+    @staticmethod
+    def minify_js(rel_path: str, js: str) -> str:
+        if rjsmin is None or rel_path.endswith('.min.js'):
+            return js
+        return rjsmin.jsmin(js)
+
+    def write_headers(self, file_manager: FileManager, extra_immutable: List[str] = ()):
+        """Пишет _headers: хэшированные файлы кэшируются навсегда"""
+        rules = [f"/{path}" for path in sorted(self.asset_urls.values())] + list(extra_immutable)
+        if len(rules) > 100:
+            logging.warning(f"_headers has {len(rules)} rules, Cloudflare Pages applies only the first 100")
+        lines = []
+        for rule in rules:
+            lines.extend([rule, f"  Cache-Control: {IMMUTABLE_CACHE_CONTROL}"])
+        file_manager.save_bytes('_headers', ('\n'.join(lines) + '\n').encode('utf-8'))
+
+    @staticmethod
+    def precompress(file_manager: FileManager):
+        """Кладёт рядом с текстовыми файлами .gz (и .br, если установлен brotli)"""
+        for path in sorted(file_manager.build_dir.rglob('*')):
+            if not path.is_file() or path.suffix not in PRECOMPRESS_EXTENSIONS:
+                continue
+            rel_path = path.relative_to(file_manager.build_dir).as_posix()
+            data = path.read_bytes()
+            file_manager.save_bytes(f"{rel_path}.gz", gzip.compress(data, compresslevel=9, mtime=0))
+            if brotli:
+                file_manager.save_bytes(f"{rel_path}.br", brotli.compress(data))
@@ -0,0 +1,36 @@
+import os
+import json
+import logging
+from pathlib import Path
+from typing import Dict, Any, Optional
+
+
+class BlockCache:
+    """Дисковый кэш деревьев блоков: по одному компактному JSON на страницу"""
+
+    def __init__(self, cache_dir: str = '.notion_cache'):
+        self.pages_dir = Path(cache_dir) / 'pages'
+        self.pages_dir.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, page_id: str) -> Path:
+        return self.pages_dir / f"{page_id.replace('-', '')}.json"
+
+    def get(self, page_id: str) -> Optional[Dict[str, Any]]:
+        """Возвращает сохранённую страницу или None"""
+        path = self._path(page_id)
+        if not path.exists():
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (IOError, ValueError) as e:
+            logging.warning(f"Ignoring broken cache entry {path}: {e}")
+            return None
+
+    def put(self, page_id: str, page: Dict[str, Any]):
+        """Атомарно сохраняет страницу (id, title, last_edited_time, fetched_at, blocks)"""
+        path = self._path(page_id)
+        tmp_path = path.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(page, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(tmp_path, path)
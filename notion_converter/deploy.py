@@ -0,0 +1,252 @@
+import os
+import json
+import math
+import time
+import base64
+import hashlib
+import logging
+import mimetypes
+import requests
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Iterator
+
+try:
+    import blake3
+except ImportError:  # без blake3 ключи не совпадут с ключами wrangler, но загрузка работает
+    blake3 = None
+
+API_BASE_URL = 'https://api.cloudflare.com/client/v4'
+# Служебные файлы Pages передаются вместе с деплоем, а не как assets
+SPECIAL_FILES = ('_headers', '_redirects', '_routes.json')
+IGNORED_FILES = {'_worker.js', '.DS_Store'}
+# Лимиты пакета загрузки как у wrangler
+MAX_BATCH_BYTES = 40 * 1024 * 1024
+MAX_BATCH_FILES = 2000
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+MAX_RETRY_DELAY = 30.0
+# Блобы без деплоев со временем удаляются из хранилища: после паузы проверяем все хэши, а не только новые
+FULL_CHECK_AFTER_SECONDS = 7 * 24 * 3600
+
+
+def asset_hash(data: bytes, extension: str) -> str:
+    """Ключ файла в хранилище Pages: как в wrangler, blake3(base64(содержимое) + расширение)[:32]"""
+    payload = base64.b64encode(data) + extension.encode('utf-8')
+    if blake3:
+        return blake3.blake3(payload).hexdigest()[:32]
+    return hashlib.sha256(payload).hexdigest()[:32]
+
+
+class PagesDeployer:
+    """Дифференциальный деплой build в Cloudflare Pages через API прямой загрузки.
+
+    Манифест прошлого деплоя хранит путь -> (хэш, размер, mtime): неизменённые файлы не хэшируются
+    заново, а в хранилище отправляются только блобы с новыми хэшами.
+    """
+
+    def __init__(self, api_token: str, account_id: str, project: str, build_dir: str = 'build',
+                 manifest_path: str = '.notion_cache/deploy-manifest.json', base_url: str = API_BASE_URL,
+                 max_workers: int = 3, max_retries: int = 5, timeout: tuple = (5.0, 120.0)):
+        self.api_token = api_token
+        self.account_id = account_id
+        self.project = project
+        self.build_dir = Path(build_dir)
+        self.manifest_path = Path(manifest_path)
+        self.base_url = base_url.rstrip('/')
+        self.max_workers = max(1, max_workers)
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.jwt: Optional[str] = None
+        self.stats = {'files': 0, 'hashed': 0, 'checked': 0, 'uploaded': 0, 'uploaded_bytes': 0, 'batches': 0}
+
+    def load_manifest(self) -> Dict[str, Any]:
+        if not self.manifest_path.exists():
+            return {}
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (IOError, ValueError) as e:
+            logging.warning(f"Ignoring broken deploy manifest {self.manifest_path}: {e}")
+            return {}
+
+    def save_manifest(self, files: Dict[str, Dict[str, Any]]):
+        self.manifest_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.manifest_path.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'deployed_at': time.time(), 'files': files}, f, separators=(',', ':'), sort_keys=True)
+        os.replace(tmp_path, self.manifest_path)
+
+    def iter_files(self) -> Iterator[Path]:
+        for path in sorted(self.build_dir.rglob('*')):
+            if not path.is_file() or path.name in IGNORED_FILES:
+                continue
+            if path.parent == self.build_dir and path.name in SPECIAL_FILES:
+                continue
+            yield path
+
+    def scan(self, previous: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        """Манифест текущего build; хэш пересчитывается только у файлов с новым размером или mtime"""
+        manifest = {}
+        for path in self.iter_files():
+            url_path = '/' + path.relative_to(self.build_dir).as_posix()
+            stat = path.stat()
+            entry = previous.get(url_path)
+            if not entry or entry['size'] != stat.st_size or entry['mtime_ns'] != stat.st_mtime_ns:
+                entry = {'hash': asset_hash(path.read_bytes(), path.suffix.lstrip('.')),
+                         'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+                self.stats['hashed'] += 1
+            manifest[url_path] = entry
+        self.stats['files'] = len(manifest)
+        return manifest
+
+    def _request(self, method: str, path: str, use_jwt: bool = False, **kwargs) -> Any:
+        """Запрос к API с повторами; возвращает поле result ответа Cloudflare"""
+        attempt = 0
+        while True:
+            if use_jwt and self.jwt is None:
+                self.jwt = self.upload_token()
+            token = self.jwt if use_jwt else self.api_token
+            response = self.session.request(method, f"{self.base_url}{path}", timeout=self.timeout,
+                                            headers={'Authorization': f"Bearer {token}"}, **kwargs)
+            # JWT загрузки живёт несколько минут: на долгом деплое получаем новый
+            if use_jwt and response.status_code == 401 and attempt < self.max_retries:
+                self.jwt = None
+            elif response.status_code not in RETRY_STATUS_CODES or attempt >= self.max_retries:
+                response.raise_for_status()
+                data = response.json()
+                if not data.get('success', True):
+                    raise RuntimeError(f"Cloudflare API error on {path}: {data.get('errors')}")
+                return data.get('result')
+            else:
+                delay = self._retry_delay(response, attempt)
+                logging.warning(f"Cloudflare API returned {response.status_code}, retrying in {delay:.1f}s")
+                time.sleep(delay)
+            attempt += 1
+
+    @staticmethod
+    def _retry_delay(response: requests.Response, attempt: int) -> float:
+        """Задержка перед повтором: Retry-After в секундах или экспоненциальный backoff, не больше MAX_RETRY_DELAY"""
+        delay = 0.5 * 2 ** attempt
+        # Retry-After может быть и HTTP-датой: её не разбираем, а ждём по backoff
+        try:
+            value = float(response.headers.get('Retry-After', ''))
+            if math.isfinite(value):
+                delay = value
+        except ValueError:
+            pass
+        return min(MAX_RETRY_DELAY, max(0.0, delay))
+
+    def upload_token(self) -> str:
+        result = self._request('GET', f"/accounts/{self.account_id}/pages/projects/{self.project}/upload-token")
+        return result['jwt']
+
+    def check_missing(self, hashes: List[str]) -> List[str]:
+        if not hashes:
+            return []
+        return self._request('POST', '/pages/assets/check-missing', use_jwt=True, json={'hashes': hashes})
+
+    def batches(self, files: Dict[str, Path]) -> Iterator[Dict[str, Path]]:
+        """Делит файлы на пакеты по размеру в base64 и количеству"""
+        batch: Dict[str, Path] = {}
+        size = 0
+        for file_hash, path in files.items():
+            file_size = (path.stat().st_size + 2) // 3 * 4
+            if batch and (size + file_size > MAX_BATCH_BYTES or len(batch) >= MAX_BATCH_FILES):
+                yield batch
+                batch, size = {}, 0
+            batch[file_hash] = path
+            size += file_size
+        if batch:
+            yield batch
+
+    def upload_batch(self, batch: Dict[str, Path]) -> int:
+        payload = []
+        uploaded_bytes = 0
+        for file_hash, path in batch.items():
+            data = path.read_bytes()
+            uploaded_bytes += len(data)
+            payload.append({
+                'key': file_hash,
+                'value': base64.b64encode(data).decode('ascii'),
+                'metadata': {'contentType': mimetypes.guess_type(path.name)[0] or 'application/octet-stream'},
+                'base64': True,
+            })
+        self._request('POST', '/pages/assets/upload', use_jwt=True, json=payload)
+        return uploaded_bytes
+
+    def upload(self, files: Dict[str, Path]):
+        """Параллельно загружает пакеты новых блобов"""
+        batches = list(self.batches(files))
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for uploaded_bytes in executor.map(self.upload_batch, batches):
+                self.stats['uploaded_bytes'] += uploaded_bytes
+        self.stats['uploaded'] += len(files)
+        self.stats['batches'] += len(batches)
+
+    def create_deployment(self, manifest: Dict[str, str], branch: Optional[str] = None,
+                          commit_message: Optional[str] = None) -> Dict[str, Any]:
+        fields = [('manifest', (None, json.dumps(manifest)))]
+        if branch:
+            fields.append(('branch', (None, branch)))
+        if commit_message:
+            fields.append(('commit_message', (None, commit_message)))
+        for name in SPECIAL_FILES:
+            path = self.build_dir / name
+            if path.is_file():
+                fields.append((name, (name, path.read_bytes())))
+        return self._request('POST', f"/accounts/{self.account_id}/pages/projects/{self.project}/deployments",
+                             files=fields)
+
+    def deploy(self, branch: Optional[str] = None, commit_message: Optional[str] = None) -> Dict[str, Any]:
+        previous = self.load_manifest()
+        previous_files = previous.get('files', {})
+        manifest = self.scan(previous_files)
+
+        files = {entry['hash']: self.build_dir / url_path.lstrip('/') for url_path, entry in manifest.items()}
+        if time.time() - previous.get('deployed_at', 0) < FULL_CHECK_AFTER_SECONDS:
+            # Локальная дельта: блобы прошлого деплоя уже в хранилище, проверяем только новые хэши
+            previous_hashes = {entry['hash'] for entry in previous_files.values()}
+            candidates = [file_hash for file_hash in files if file_hash not in previous_hashes]
+        else:
+            candidates = list(files)
+        self.stats['checked'] = len(candidates)
+        missing = self.check_missing(candidates)
+        if missing:
+            self.upload({file_hash: files[file_hash] for file_hash in missing})
+        # Продлевает срок хранения всех блобов, на которые ссылается деплой
+        self._request('POST', '/pages/assets/upsert-hashes', use_jwt=True, json={'hashes': list(files)})
+
+        deployment = self.create_deployment({url_path: entry['hash'] for url_path, entry in manifest.items()},
+                                            branch, commit_message)
+        # Манифест сохраняется только после успешного деплоя
+        self.save_manifest(manifest)
+        logging.info(f"Deployed {deployment.get('url', self.project)}: {self.stats}")
+        return deployment
+
+    def close(self):
+        self.session.close()
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    api_token = os.getenv('CLOUDFLARE_API_TOKEN')
+    account_id = os.getenv('CLOUDFLARE_ACCOUNT_ID')
+    project = os.getenv('CLOUDFLARE_PROJECT')
+    if not api_token or not account_id or not project:
+        raise ValueError("Required environment variables are not set")
+
+    cache_dir = os.getenv('NOTION_CACHE_DIR', '.notion_cache') or '.notion_cache'
+    deployer = PagesDeployer(api_token, account_id, project,
+                             build_dir=os.getenv('CLOUDFLARE_BUILD_DIR', 'build'),
+                             manifest_path=os.path.join(cache_dir, 'deploy-manifest.json'),
+                             base_url=os.getenv('CLOUDFLARE_API_BASE_URL', API_BASE_URL),
+                             max_workers=int(os.getenv('CLOUDFLARE_UPLOAD_WORKERS', '3')))
+    try:
+        deployer.deploy(branch=os.getenv('CLOUDFLARE_BRANCH'), commit_message=os.getenv('CLOUDFLARE_COMMIT_MESSAGE'))
+    finally:
+        deployer.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+import re
+import unicodedata
+from typing import List, Dict, Any, Optional, Tuple
+from rich_text import render_rich_text, plain_text
+
+# Простые свойства блоков, которые нужны рендерингу, — остальной JSON Notion отбрасывается
+SCALAR_PROPS = ('language', 'checked', 'url', 'has_column_header', 'has_row_header', 'title')
+HEADING_TYPES = {'heading_1': 1, 'heading_2': 2, 'heading_3': 3}
+
+CYRILLIC = dict(zip(
+    'абвгдеёжзийклмнопрстуфхцчшщъыьэюя',
+    ['a', 'b', 'v', 'g', 'd', 'e', 'e', 'zh', 'z', 'i', 'y', 'k', 'l', 'm', 'n', 'o', 'p', 'r', 's', 't',
+     'u', 'f', 'h', 'ts', 'ch', 'sh', 'sch', '', 'y', '', 'e', 'yu', 'ya'],
+))
+
+
+class Node:
+    """Компактный блок документа: только то, что нужно для HTML, оглавления и поиска"""
+    __slots__ = ('type', 'html', 'text', 'props', 'children')
+
+    def __init__(self, type: Optional[str], html: str = '', text: str = '',
+                 props: Optional[Dict[str, Any]] = None, children: Optional[List['Node']] = None):
+        self.type = type
+        self.html = html
+        self.text = text
+        self.props = props or {}
+        self.children = children or []
+
+
+class Heading:
+    __slots__ = ('level', 'text', 'anchor', 'children')
+
+    def __init__(self, level: int, text: str, anchor: str):
+        self.level = level
+        self.text = text
+        self.anchor = anchor
+        self.children: List['Heading'] = []
+
+
+class Document:
+    __slots__ = ('nodes', 'toc')
+
+    def __init__(self, nodes: List[Node], toc: List[Heading]):
+        self.nodes = nodes
+        # Вложенное оглавление heading_1 > heading_2 > heading_3
+        self.toc = toc
+
+
+def slugify(text: str) -> str:
+    """URL-безопасный якорь: латиница, цифры и дефисы"""
+    text = ''.join(CYRILLIC.get(char, char) for char in text.lower())
+    text = unicodedata.normalize('NFKD', text).encode('ascii', 'ignore').decode('ascii')
+    return re.sub(r'[^a-z0-9]+', '-', text).strip('-') or 'section'
+
+
+class Slugs:
+    """Выдаёт уникальные слаги: повторы получают суффиксы -2, -3, ..."""
+    __slots__ = ('seen',)
+
+    def __init__(self, reserved: Tuple[str, ...] = ()):
+        self.seen: Dict[str, int] = {slug: 1 for slug in reserved}
+
+    def unique(self, text: str) -> str:
+        slug = slugify(text)
+        count = self.seen.get(slug, 0) + 1
+        self.seen[slug] = count
+        return slug if count == 1 else f"{slug}-{count}"
+
+
+# id элементов templates/template.html: якорь заголовка не должен их повторять,
+# иначе тема и search.js найдут заголовок вместо элемента разметки
+TEMPLATE_IDS = ('wrapper', 'main', 'header', 'sidebar', 'search', 'search-form', 'query',
+                'search-results', 'menu', 'footer')
+
+
+class DocumentBuilder:
+    """Строит Document за один проход по дереву блоков Notion"""
+
+    def __init__(self):
+        self.anchors = Slugs(reserved=TEMPLATE_IDS)
+        self.toc: List[Heading] = []
+        self.toc_stack: List[Heading] = []
+
+    def build(self, blocks: List[Dict[str, Any]]) -> Document:
+        return Document(self.convert(blocks), self.toc)
+
+    def convert(self, blocks: List[Dict[str, Any]]) -> List[Node]:
+        return [self.convert_block(block) for block in blocks]
+
+    def convert_block(self, block: Dict[str, Any]) -> Node:
+        block_type = block.get('type')
+        data = block.get(block_type) or {}
+        node = Node(block_type)
+
+        rich_text = data.get('rich_text')
+        if rich_text:
+            node.text = plain_text(rich_text)
+            # Код подсвечивается/экранируется отдельно, ему нужен только сырой текст
+            if block_type != 'code':
+                node.html = render_rich_text(rich_text)
+
+        props = {key: data[key] for key in SCALAR_PROPS if data.get(key) is not None}
+        if data.get('caption'):
+            props['caption'] = render_rich_text(data['caption'])
+            props['caption_text'] = plain_text(data['caption'])
+        if isinstance(data.get('icon'), dict) and data['icon'].get('emoji'):
+            props['icon'] = data['icon']['emoji']
+        if block_type == 'image':
+            source = data.get(data.get('type')) or data.get('file') or {}
+            props['url'] = source.get('url')
+            props['signed'] = data.get('type') != 'external'
+        if block_type == 'child_page':
+            props['page_id'] = block.get('id')
+        if block_type == 'table_row':
+            props['cells'] = [render_rich_text(cell) for cell in data.get('cells', [])]
+            node.text = ' '.join(plain_text(cell) for cell in data.get('cells', []))
+        if block_type in HEADING_TYPES:
+            props['anchor'] = self.add_heading(HEADING_TYPES[block_type], node)
+        node.props = props
+
+        if block.get('children'):
+            node.children = self.convert(block['children'])
+        return node
+
+    def add_heading(self, level: int, node: Node) -> str:
+        heading = Heading(level, node.text, self.anchors.unique(node.text))
+        while self.toc_stack and self.toc_stack[-1].level >= level:
+            self.toc_stack.pop()
+        (self.toc_stack[-1].children if self.toc_stack else self.toc).append(heading)
+        self.toc_stack.append(heading)
+        return heading.anchor
+
+
+def build_document(blocks: List[Dict[str, Any]]) -> Document:
+    return DocumentBuilder().build(blocks)
@@ -1,35 +1,231 @@
-import os
-import shutil
-import logging
-from pathlib import Path
-from typing import Dict, Any
-
-class FileManager:
-    def __init__(self, base_dir: str = '.'):
-        self.base_dir = Path(base_dir)
-        self.build_dir = self.base_dir / 'build'
-        self.assets_dir = self.base_dir / 'assets'
-        self.ensure_build_directory()
-
-    def ensure_build_directory(self):
-        """Подготавливает build директорию"""
-        if self.build_dir.exists():
-            shutil.rmtree(self.build_dir)
-        self.build_dir.mkdir(parents=True)
-        
-        # Копируем assets
-        build_assets = self.build_dir / 'assets'
-        shutil.copytree(self.assets_dir, build_assets)
-        logging.info(f"Build directory prepared at {self.build_dir}")
-
-    def save_html(self, filename: str, content: str):
-        """Сохраняет HTML файл"""
-        output_path = self.build_dir / f"{filename}.html"
-        
-        try:
-            with open(output_path, 'w', encoding='utf-8') as f:
-                f.write(content)
-            logging.info(f"Generated {output_path}")
-        except IOError as e:
-            logging.error(f"Error saving file {output_path}: {e}")
-            raise
\ No newline at end of file
+import os
+import time
+import uuid
+import shutil
+import hashlib
+import logging
+from pathlib import Path
+from typing import Dict, Any, Iterable, Optional
+from metrics import metrics
+
+try:
+    import fcntl
+except ImportError:  # без fcntl (Windows) сборки не блокируют друг друга, остаётся только порог возраста
+    fcntl = None
+
+# Исходники, которые не отдаются сайтом и не должны попадать в build
+IGNORED_ASSETS = ('sass',)
+# В инкрементальном режиме build — символическая ссылка на каталог сборки build.<id>
+BUILD_DIR_PREFIX = 'build.'
+# Каталог сборки, не менявшийся столько времени, считается брошенным (сборка прервана)
+STALE_BUILD_SECONDS = 3600
+
+class FileManager:
+    def __init__(self, base_dir: str = '.', incremental: bool = True, copy_assets: bool = True):
+        self.base_dir = Path(base_dir)
+        self.output_dir = self.base_dir / 'build'
+        self.assets_dir = self.base_dir / 'assets'
+        self.incremental = incremental
+        self.copy_assets = copy_assets
+        # В инкрементальном режиме собираем в новый каталог и переключаем на него ссылку build в finalize()
+        build_id = f"{time.strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        self.build_dir = self.base_dir / f"{BUILD_DIR_PREFIX}{build_id}" if incremental else self.output_dir
+        self.stats = {'written': 0, 'unchanged': 0}
+        self.lock_file = None
+        self.acquire_lock()
+        self.ensure_build_directory()
+
+    def acquire_lock(self):
+        """Эксклюзивная блокировка build.lock на время сборки.
+
+        Режим наблюдения и сборка по расписанию в том же каталоге не должны одновременно
+        переключать ссылку build и удалять каталоги друг друга: вторая сборка ждёт первую.
+        """
+        if fcntl is None:
+            return
+        self.lock_file = open(self.base_dir / f"{BUILD_DIR_PREFIX}lock", 'w')
+        try:
+            fcntl.flock(self.lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            logging.info("Another build is running in this directory, waiting for it to finish")
+            fcntl.flock(self.lock_file, fcntl.LOCK_EX)
+
+    def release_lock(self):
+        if self.lock_file:
+            self.lock_file.close()
+            self.lock_file = None
+
+    def ensure_build_directory(self):
+        """Подготавливает build директорию"""
+        if not self.incremental and self.output_dir.is_symlink():
+            # Переход из инкрементального режима: вместо ссылки нужен обычный каталог
+            previous_dir = self.output_dir.resolve()
+            self.output_dir.unlink()
+            shutil.rmtree(previous_dir, ignore_errors=True)
+        self.remove_stale_builds()
+        if self.build_dir.exists():
+            shutil.rmtree(self.build_dir)
+        self.build_dir.mkdir(parents=True)
+
+        # Копируем assets (если их не обрабатывает AssetPipeline)
+        if not self.copy_assets:
+            pass
+        elif self.incremental:
+            for src in sorted(self.assets_dir.rglob('*')):
+                rel_path = src.relative_to(self.base_dir)
+                if src.is_file() and rel_path.parts[1] not in IGNORED_ASSETS:
+                    self.add_file(src, rel_path)
+        else:
+            shutil.copytree(self.assets_dir, self.build_dir / 'assets',
+                            ignore=shutil.ignore_patterns(*IGNORED_ASSETS))
+        logging.info(f"Build directory prepared at {self.build_dir}")
+
+    def remove_stale_builds(self, max_age: float = STALE_BUILD_SECONDS):
+        """Удаляет брошенные каталоги build.<id>: не текущий, не свой и без изменений дольше max_age.
+
+        Порог возраста защищает каталог, в который прямо сейчас пишет другая сборка,
+        если блокировка недоступна (нет fcntl или каталог на сетевой ФС).
+        """
+        current = self.output_dir.resolve() if self.output_dir.is_symlink() else None
+        deadline = time.time() - max_age
+        for path in self.base_dir.glob(f"{BUILD_DIR_PREFIX}*"):
+            if (path.is_dir() and not path.is_symlink() and path.resolve() not in (current, self.build_dir.resolve())
+                    and path.stat().st_mtime < deadline):
+                shutil.rmtree(path)
+
+    @staticmethod
+    def file_hash(path: Path) -> str:
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def _unchanged_previous(self, path: Path, rel_path: Path) -> Optional[Path]:
+        """Возвращает файл из предыдущей сборки с тем же содержимым или None"""
+        previous = self.output_dir / rel_path
+        if (self.incremental and previous.is_file()
+                and previous.stat().st_size == path.stat().st_size
+                and self.file_hash(previous) == self.file_hash(path)):
+            return previous
+        return None
+
+    def _link(self, src: Path, dst: Path):
+        try:
+            os.link(src, dst)
+        except OSError:
+            shutil.copy2(src, dst)
+
+    def add_file(self, src: Path, rel_path: Path):
+        """Кладёт файл в build: неизменённые файлы берутся хардлинком из предыдущей сборки"""
+        dst = self.build_dir / rel_path
+        dst.parent.mkdir(parents=True, exist_ok=True)
+        previous = self._unchanged_previous(src, rel_path)
+        if previous:
+            self._link(previous, dst)
+            self._count('unchanged')
+        else:
+            shutil.copy2(src, dst)
+            self._count('written', dst)
+
+    def keep_previous(self, rel_path: str) -> bool:
+        """Переносит файл предыдущей сборки без перегенерации; False, если его нет"""
+        previous = self.output_dir / rel_path
+        if not self.incremental or not previous.is_file():
+            return False
+        output_path = self.build_dir / rel_path
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        self._link(previous, output_path)
+        self._count('unchanged')
+        return True
+
+    def _keep_unchanged(self, output_path: Path):
+        """Если записанный файл совпадает с предыдущей сборкой, подставляет старый (сохраняя mtime)"""
+        previous = self._unchanged_previous(output_path, output_path.relative_to(self.build_dir))
+        if previous:
+            tmp_path = output_path.with_name(output_path.name + '.link')
+            self._link(previous, tmp_path)
+            os.replace(tmp_path, output_path)
+            self._count('unchanged')
+        else:
+            self._count('written', output_path)
+
+    def _count(self, key: str, path: Optional[Path] = None):
+        self.stats[key] += 1
+        metrics.incr(f"files.{key}")
+        if path is not None:
+            metrics.incr('files.bytes_written', path.stat().st_size)
+
+    def save_bytes(self, rel_path: str, data: bytes):
+        """Сохраняет произвольный файл в build по относительному пути"""
+        output_path = self.build_dir / rel_path
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(output_path, 'wb') as f:
+            f.write(data)
+        self._keep_unchanged(output_path)
+
+    def save_html(self, filename: str, content: str):
+        """Сохраняет HTML файл"""
+        output_path = self.build_dir / f"{filename}.html"
+        started = time.perf_counter()
+
+        try:
+            with open(output_path, 'w', encoding='utf-8') as f:
+                f.write(content)
+            self._keep_unchanged(output_path)
+            metrics.observe('files.page_write_seconds', time.perf_counter() - started)
+            logging.info(f"Generated {output_path}")
+        except IOError as e:
+            logging.error(f"Error saving file {output_path}: {e}")
+            raise
+
+    def save_html_stream(self, filename: str, chunks: Iterable[str]):
+        """Сохраняет HTML файл, записывая части по мере их генерации"""
+        output_path = self.build_dir / f"{filename}.html"
+        started = time.perf_counter()
+
+        try:
+            with open(output_path, 'w', encoding='utf-8') as f:
+                for chunk in chunks:
+                    f.write(chunk)
+            self._keep_unchanged(output_path)
+            # Включает рендер страницы: при потоковой записи он происходит внутри цикла
+            metrics.observe('files.page_stream_seconds', time.perf_counter() - started)
+            logging.info(f"Generated {output_path}")
+        except IOError as e:
+            logging.error(f"Error saving file {output_path}: {e}")
+            raise
+
+    def finalize(self):
+        """Атомарно переключает ссылку build на новую сборку.
+
+        build всегда указывает на целую сборку: до os.replace — на предыдущую, после — на новую.
+        Каталог прерванной сборки удаляется одной из следующих сборок, когда станет старше
+        STALE_BUILD_SECONDS.
+        """
+        if not self.incremental:
+            self.release_lock()
+            return
+        previous_dir = None
+        if self.output_dir.is_symlink():
+            previous_dir = self.output_dir.resolve()
+        elif self.output_dir.exists():
+            # Однократный переход с обычного каталога build: ссылку нельзя положить поверх каталога
+            previous_dir = self.base_dir / f"{BUILD_DIR_PREFIX}legacy"
+            if previous_dir.exists():
+                shutil.rmtree(previous_dir)
+            os.rename(self.output_dir, previous_dir)
+        link_path = self.base_dir / f"{BUILD_DIR_PREFIX}link"
+        if link_path.is_symlink():
+            link_path.unlink()
+        # Относительная ссылка: каталог проекта можно перемещать
+        os.symlink(self.build_dir.name, link_path, target_is_directory=True)
+        os.replace(link_path, self.output_dir)
+        # Заменённая сборка больше не нужна; её не читает никто, кроме держателя блокировки
+        if previous_dir and previous_dir.is_dir() and previous_dir != self.build_dir.resolve():
+            shutil.rmtree(previous_dir)
+        self.remove_stale_builds()
+        self.build_dir = self.output_dir
+        self.release_lock()
+        logging.info(f"Build swapped in: {self.stats['written']} files written, "
+                     f"{self.stats['unchanged']} unchanged")
@@ -0,0 +1,103 @@
+import os
+import time
+import hashlib
+import logging
+from pathlib import Path
+from typing import Dict, Any
+
+try:
+    import pygments
+    from pygments import highlight
+    from pygments.lexers import get_lexer_by_name
+    from pygments.formatters import HtmlFormatter
+    from pygments.util import ClassNotFound
+except ImportError:  # без Pygments код выводится просто экранированным
+    pygments = None
+
+# Языки Notion, названия которых не совпадают с алиасами лексеров Pygments
+NOTION_LANGUAGES = {
+    'plain text': 'text',
+    'plaintext': 'text',
+    'java/c/c++/c#': 'java',
+    'markup': 'html',
+    'flow': 'javascript',
+    'reason': 'reasonml',
+    'vb.net': 'vbnet',
+    'visual basic': 'vbnet',
+    'webassembly': 'wast',
+    'mermaid': 'text',
+}
+CSS_SCOPE = 'code.highlight'
+STYLESHEET_PATH = 'assets/css/highlight.css'
+# Записи кэша, которые не использовались столько времени, удаляются
+PRUNE_AFTER_SECONDS = 30 * 24 * 3600
+
+
+class Highlighter:
+    """Подсветка кода при сборке с дисковым кэшем по хэшу (язык, код)"""
+
+    def __init__(self, cache_dir: str = '.notion_cache/highlight', style: str = 'default'):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.style = style
+        # nowrap: только span-токены, обёртка <pre><code> остаётся в шаблоне code.html
+        self.formatter = HtmlFormatter(nowrap=True, style=style)
+        self.lexers: Dict[str, Any] = {}
+        self.stats = {'cached': 0, 'highlighted': 0}
+
+    @staticmethod
+    def cache_key(language: str, code: str) -> str:
+        # Версия Pygments входит в ключ: после обновления лексеров кэш пересобирается
+        payload = f"{pygments.__version__}\0{language}\0{code}".encode('utf-8')
+        return hashlib.sha256(payload).hexdigest()[:32]
+
+    def get_lexer(self, language: str):
+        lexer = self.lexers.get(language)
+        if lexer is None:
+            options = {'stripnl': False, 'ensurenl': False}
+            try:
+                lexer = get_lexer_by_name(NOTION_LANGUAGES.get(language, language), **options)
+            except ClassNotFound:
+                lexer = get_lexer_by_name('text', **options)
+            self.lexers[language] = lexer
+        return lexer
+
+    def highlight(self, code: str, language: str) -> str:
+        """HTML с токенами Pygments для содержимого <code>"""
+        language = (language or 'plain text').lower()
+        key = self.cache_key(language, code)
+        path = self.cache_dir / key[:2] / f"{key}.html"
+        try:
+            html = path.read_text(encoding='utf-8')
+            # mtime отмечает использование записи для prune()
+            os.utime(path)
+            self.stats['cached'] += 1
+            return html
+        except FileNotFoundError:
+            pass
+
+        html = highlight(code, self.get_lexer(language), self.formatter)
+        path.parent.mkdir(exist_ok=True)
+        # Запись атомарная: параллельные процессы рендеринга могут подсвечивать один и тот же код
+        tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        tmp_path.write_text(html, encoding='utf-8')
+        os.replace(tmp_path, path)
+        self.stats['highlighted'] += 1
+        return html
+
+    def stylesheet(self) -> str:
+        """Единственная таблица стилей для всех подсвеченных блоков"""
+        # Только правила токенов: фон и отступы <pre> задаёт тема сайта
+        return '\n'.join(self.formatter.get_token_style_defs(CSS_SCOPE)) + '\n'
+
+    def prune(self, max_age: float = PRUNE_AFTER_SECONDS) -> int:
+        """Удаляет записи кэша, не использовавшиеся дольше max_age секунд"""
+        deadline = time.time() - max_age
+        removed = 0
+        for path in self.cache_dir.glob('*/*.html'):
+            if path.stat().st_mtime < deadline:
+                path.unlink()
+                removed += 1
+        if removed:
+            logging.info(f"Removed {removed} stale highlight cache entries")
+        return removed
@@ -1,108 +1,250 @@
-from typing import List, Dict, Any
-from html import escape
-from template_engine import TemplateEngine
-
-class HTMLRenderer:
-    def __init__(self, template_engine: TemplateEngine):
-        self.template_engine = template_engine
-
-    def get_text_content(self, rich_text: List[Dict[str, Any]]) -> str:
-        """Извлекает текст из rich_text объекта Notion"""
-        return ''.join([t.get('plain_text', '') for t in rich_text])
-
-    def convert_to_html(self, blocks: List[Dict[str, Any]]) -> str:
-        """Конвертирует блоки Notion в HTML"""
-        html_content = []
-        list_type = None
-
-        for block in blocks:
-            block_type = block.get('type')
-
-            if block_type == 'paragraph':
-                text = self.get_text_content(block['paragraph'].get('rich_text', []))
-                html_content.append(
-                    self.template_engine.render_block('paragraph', content=text)
-                )
-
-            elif block_type.startswith('heading_'):
-                level = int(block_type.split('_')[-1])
-                text = self.get_text_content(block[block_type].get('rich_text', []))
-                heading_id = text.replace(" ", "-").lower()
-                html_content.append(
-                    self.template_engine.render_block('heading',
-                        content=text,
-                        level=level,
-                        heading_id=heading_id
-                    )
-                )
-
-            elif block_type == 'code':
-                code = escape(self.get_text_content(block['code'].get('rich_text', [])))
-                language = block['code'].get('language') or 'plaintext'
-                html_content.append(
-                    self.template_engine.render_block('code',
-                        content=code,
-                        language=language
-                    )
-                )
-
-            elif block_type == 'image':
-                image_data = block['image']
-                if 'file' in image_data:
-                    image_url = image_data['file']['url']
-                    html_content.append(
-                        self.template_engine.render_block('image',
-                            url=image_url,
-                            alt="Notion image"
-                        )
-                    )
-
-            elif block_type == 'callout':
-                icon = block['callout']['icon'].get('emoji', '')
-                text = self.get_text_content(block['callout'].get('rich_text', []))
-                html_content.append(
-                    self.template_engine.render_block('callout',
-                        icon=icon,
-                        content=text
-                    )
-                )
-
-            elif block_type in ['bulleted_list_item', 'numbered_list_item']:
-                current_list = 'ul' if block_type == 'bulleted_list_item' else 'ol'
-                text = self.get_text_content(block[block_type].get('rich_text', []))
-                
-                if list_type != current_list:
-                    if list_type:
-                        html_content.append(f"</{list_type}>")
-                    html_content.append(f"<{current_list}>")
-                    list_type = current_list
-                
-                html_content.append(
-                    self.template_engine.render_block('list_item',
-                        content=text
-                    )
-                )
-
-        if list_type:
-            html_content.append(f"</{list_type}>")
-
-        return '\n'.join(html_content)
-
-    def generate_toc(self, blocks: List[Dict[str, Any]]) -> str:
-        """Генерирует оглавление"""
-        toc_items = []
-        
-        for block in blocks:
-            if block.get('type') == 'heading_1':
-                text = self.get_text_content(block['heading_1'].get('rich_text', []))
-                heading_id = text.replace(" ", "-").lower()
-                toc_items.append(
-                    self.template_engine.render_block('toc_item',
-                        content=text,
-                        heading_id=heading_id
-                    )
-                )
-
-        return self.template_engine.render_block('toc',
-            items=toc_items
-        )
+from collections import Counter
+from itertools import groupby
+from typing import List, Dict, Any, Callable, Iterable, Iterator, Optional, Tuple
+from html import escape
+from template_engine import TemplateEngine
+from highlighter import Highlighter
+from document import Document, Node, Heading
+
+BlockHandler = Callable[[Node], str]
+
+# Блоки списков, которые нужно группировать в общий <ul>/<ol>
+LIST_TAGS = {'bulleted_list_item': 'ul', 'numbered_list_item': 'ol'}
+
+class HTMLRenderer:
+    def __init__(self, template_engine: TemplateEngine, highlighter: Optional[Highlighter] = None):
+        self.template_engine = template_engine
+        # Подсветка кода при сборке; без неё код выводится экранированным текстом
+        self.highlighter = highlighter
+        self.unhandled = Counter()
+        self.block_counts = Counter()
+        # url -> локальная копия картинки (заполняется ImagePipeline)
+        self.images: Dict[str, Dict[str, Any]] = {}
+        # id страницы без дефисов -> имя HTML-файла сайта (для ссылок child_page)
+        self.page_urls: Dict[str, str] = {}
+        self.renderers: Dict[str, BlockHandler] = {}
+        # Тип блока -> (шаблон, контекст узла): подряд идущие листовые блоки рендерятся одним вызовом
+        self.batchable: Dict[str, Tuple[str, Callable[[Node], Dict[str, Any]]]] = {}
+        self.register_default_renderers()
+
+    def register(self, block_type: str, handler: BlockHandler):
+        """Регистрирует рендерер для типа блока (заменяет существующий)"""
+        self.renderers[block_type] = handler
+        # Собственный обработчик отключает пакетный рендеринг этого типа
+        self.batchable.pop(block_type, None)
+
+    def register_default_renderers(self):
+        for block_type in ('heading_1', 'heading_2', 'heading_3'):
+            self.register(block_type, self.render_heading)
+        for block_type in LIST_TAGS:
+            self.register(block_type, self.render_list_item)
+        self.register('synced_block', self.render_children)
+        self.register('paragraph', self.render_paragraph)
+        self.register('code', self.render_code)
+        self.register('image', self.render_image)
+        self.register('callout', self.render_callout)
+        self.register('quote', self.render_quote)
+        self.register('divider', self.render_divider)
+        self.register('to_do', self.render_to_do)
+        self.register('toggle', self.render_toggle)
+        self.register('bookmark', self.render_bookmark)
+        self.register('embed', self.render_embed)
+        self.register('table', self.render_table)
+        self.register('column_list', self.render_column_list)
+        self.register('column', self.render_column)
+        self.register('child_page', self.render_child_page)
+        # Страницы базы данных попадают в навигацию, сама база на странице не выводится
+        self.register('child_database', lambda node: '')
+        self.batchable['paragraph'] = ('paragraph', self.paragraph_context)
+        for block_type in LIST_TAGS:
+            self.batchable[block_type] = ('list_item', self.list_item_context)
+
+    def convert_to_html(self, nodes: List[Node]) -> str:
+        """Конвертирует узлы документа в HTML"""
+        return ''.join(self.iter_html(nodes))
+
+    def iter_html(self, nodes: List[Node]) -> Iterator[str]:
+        """Генератор HTML по одному блоку верхнего уровня, для потоковой записи"""
+        separator = ''
+        list_type = None
+
+        for block_type, run in groupby(nodes, key=lambda node: node.type):
+            current_list = LIST_TAGS.get(block_type)
+            if list_type != current_list:
+                if list_type:
+                    yield f"{separator}</{list_type}>"
+                    separator = '\n'
+                if current_list:
+                    yield f"{separator}<{current_list}>"
+                    separator = '\n'
+                list_type = current_list
+
+            for html in self.render_run(block_type, run):
+                if html:
+                    yield separator + html
+                    separator = '\n'
+
+        if list_type:
+            yield f"{separator}</{list_type}>"
+
+    def render_run(self, block_type: str, nodes: Iterable[Node]) -> Iterator[str]:
+        """Рендерит подряд идущие блоки одного типа; листовые блоки из batchable — пачками"""
+        batchable = self.batchable.get(block_type)
+        batch: List[Node] = []
+        for node in nodes:
+            if batchable and not node.children:
+                batch.append(node)
+                continue
+            if batch:
+                yield self.render_batch(block_type, batch)
+                batch = []
+            yield self.render(node)
+        if batch:
+            yield self.render_batch(block_type, batch)
+
+    def render_batch(self, block_type: str, nodes: List[Node]) -> str:
+        template_name, context = self.batchable[block_type]
+        self.block_counts[block_type] += len(nodes)
+        return self.template_engine.render_blocks(template_name, [context(node) for node in nodes], separator='\n')
+
+    def render(self, node: Node) -> str:
+        """Рендерит один блок через зарегистрированный обработчик"""
+        block_type = node.type or 'unknown'
+        self.block_counts[block_type] += 1
+        handler = self.renderers.get(node.type)
+        if handler is None:
+            # Неизвестный блок пропускаем, но его содержимое не теряем
+            self.unhandled[block_type] += 1
+            return self.render_children(node)
+        return handler(node)
+
+    def render_children(self, node: Node) -> str:
+        return self.convert_to_html(node.children) if node.children else ''
+
+    def paragraph_context(self, node: Node) -> Dict[str, Any]:
+        return {'content': node.html}
+
+    def render_paragraph(self, node: Node) -> str:
+        html = self.template_engine.render_block('paragraph', **self.paragraph_context(node))
+        return html + self.render_children(node)
+
+    def render_heading(self, node: Node) -> str:
+        html = self.template_engine.render_block('heading',
+            content=node.html,
+            level=int(node.type[-1]),
+            heading_id=node.props['anchor']
+        )
+        return html + self.render_children(node)
+
+    def render_code(self, node: Node) -> str:
+        language = node.props.get('language') or 'plaintext'
+        if self.highlighter:
+            content = self.highlighter.highlight(node.text, language)
+        else:
+            content = escape(node.text)
+        return self.template_engine.render_block('code',
+            content=content,
+            language=language,
+            highlighted=self.highlighter is not None
+        )
+
+    def render_image(self, node: Node) -> str:
+        url = node.props.get('url')
+        if not url:
+            return ''
+        mirrored = self.images.get(url, {})
+        return self.template_engine.render_block('image',
+            url=mirrored.get('src', url),
+            srcset=mirrored.get('srcset'),
+            width=mirrored.get('width'),
+            height=mirrored.get('height'),
+            alt=node.props.get('caption_text') or "Notion image"
+        )
+
+    def render_callout(self, node: Node) -> str:
+        return self.template_engine.render_block('callout',
+            icon=node.props.get('icon', ''),
+            content=node.html,
+            children=self.render_children(node)
+        )
+
+    def render_quote(self, node: Node) -> str:
+        return self.template_engine.render_block('quote',
+            content=node.html,
+            children=self.render_children(node)
+        )
+
+    def render_divider(self, node: Node) -> str:
+        return self.template_engine.render_block('divider')
+
+    def list_item_context(self, node: Node) -> Dict[str, Any]:
+        return {'content': node.html + self.render_children(node)}
+
+    def render_list_item(self, node: Node) -> str:
+        return self.template_engine.render_block('list_item', **self.list_item_context(node))
+
+    def render_to_do(self, node: Node) -> str:
+        return self.template_engine.render_block('to_do',
+            content=node.html,
+            checked=node.props.get('checked', False),
+            children=self.render_children(node)
+        )
+
+    def render_toggle(self, node: Node) -> str:
+        return self.template_engine.render_block('toggle',
+            content=node.html,
+            children=self.render_children(node)
+        )
+
+    def render_bookmark(self, node: Node) -> str:
+        url = node.props.get('url')
+        if not url:
+            return ''
+        return self.template_engine.render_block('bookmark',
+            url=url,
+            caption=node.props.get('caption') or escape(url)
+        )
+
+    def render_embed(self, node: Node) -> str:
+        url = node.props.get('url')
+        if not url:
+            return ''
+        return self.template_engine.render_block('embed', url=url)
+
+    def render_table(self, node: Node) -> str:
+        rows = [row.props.get('cells', []) for row in node.children if row.type == 'table_row']
+        return self.template_engine.render_block('table',
+            rows=rows,
+            has_column_header=node.props.get('has_column_header', False),
+            has_row_header=node.props.get('has_row_header', False)
+        )
+
+    def render_column_list(self, node: Node) -> str:
+        columns = node.children
+        span = max(1, 12 // max(1, len(columns)))
+        return self.template_engine.render_block('column_list',
+            children='\n'.join(self.render_column(column, span) for column in columns)
+        )
+
+    def render_column(self, node: Node, span: int = 12) -> str:
+        return self.template_engine.render_block('column', span=span, children=self.render_children(node))
+
+    def render_child_page(self, node: Node) -> str:
+        url = self.page_urls.get((node.props.get('page_id') or '').replace('-', ''))
+        if not url:
+            return ''
+        return self.template_engine.render_block('child_page', url=url, title=node.props.get('title') or 'Untitled')
+
+    def generate_toc(self, document: Document) -> str:
+        """Генерирует вложенное оглавление по heading_1–heading_3"""
+        return self.render_toc(document.toc)
+
+    def render_toc(self, headings: List[Heading]) -> str:
+        if not headings:
+            return ''
+        toc_items = self.template_engine.render_blocks('toc_item', [
+            # Текст без ссылок: пункт оглавления сам является ссылкой
+            {'content': escape(heading.text), 'heading_id': heading.anchor, 'children': self.render_toc(heading.children)}
+            for heading in headings
+        ], separator='\n')
+        return self.template_engine.render_block('toc', items=toc_items)
@@ -0,0 +1,172 @@
+import io
+import json
+import hashlib
+import logging
+import mimetypes
+import threading
+import requests
+from pathlib import Path
+from urllib.parse import urlsplit, urlunsplit
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Tuple
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow необязателен: без него картинки зеркалируются без WebP-вариантов
+    Image = None
+
+# Ширины адаптивных вариантов для srcset
+VARIANT_WIDTHS = (480, 960, 1600)
+RESIZABLE_TYPES = {'.jpg', '.jpeg', '.png', '.webp'}
+MEDIA_PREFIX = Path('assets') / 'media'
+
+
+class ImagePipeline:
+    """Скачивает картинки страниц в build/assets/media под именами по хэшу содержимого"""
+
+    def __init__(self, cache_dir: str = '.notion_cache', max_workers: int = 8,
+                 widths: Tuple[int, ...] = VARIANT_WIDTHS, timeout: Tuple[float, float] = (5.0, 60.0)):
+        self.media_dir = Path(cache_dir) / 'media'
+        self.media_dir.mkdir(parents=True, exist_ok=True)
+        self.index_path = Path(cache_dir) / 'media.json'
+        self.index = self.load_index()
+        self.max_workers = max(1, max_workers)
+        self.widths = widths
+        self.timeout = timeout
+        # Без заголовков Notion: подписанные ссылки S3 не принимают чужой Authorization
+        self.session = requests.Session()
+        self.stats = {'downloaded': 0, 'cached': 0, 'failed': 0}
+        self.stats_lock = threading.Lock()
+        self.used = {}
+
+    def load_index(self) -> Dict[str, Dict[str, Any]]:
+        if self.index_path.exists():
+            try:
+                with open(self.index_path, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+            except (IOError, ValueError) as e:
+                logging.warning(f"Ignoring broken media index {self.index_path}: {e}")
+        return {}
+
+    def save_index(self):
+        with open(self.index_path, 'w', encoding='utf-8') as f:
+            json.dump(self.index, f, ensure_ascii=False, separators=(',', ':'))
+
+    @staticmethod
+    def stable_key(url: str, signed: bool) -> str:
+        """Ключ картинки между запусками: у подписанных ссылок Notion отбрасываем query"""
+        if not signed:
+            return url
+        parts = urlsplit(url)
+        return urlunsplit((parts.scheme, parts.netloc, parts.path, '', ''))
+
+    def collect_images(self, nodes: List[Any]) -> Dict[str, str]:
+        """Собирает url -> стабильный ключ для всех картинок документа"""
+        images = {}
+        stack = list(nodes)
+        while stack:
+            node = stack.pop()
+            if node.type == 'image' and node.props.get('url'):
+                images[node.props['url']] = self.stable_key(node.props['url'], node.props['signed'])
+            stack.extend(node.children)
+        return images
+
+    def process(self, pages: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        """Зеркалирует картинки всех страниц. Возвращает url -> {'src', 'srcset', 'width', 'height'}"""
+        images = {}
+        for page in pages:
+            images.update(self.collect_images(page['document'].nodes))
+
+        missing = {}
+        for url, key in images.items():
+            entry = self.index.get(key)
+            if entry and all((self.media_dir / name).exists() for name in entry['files']):
+                self.stats['cached'] += 1
+            else:
+                missing[key] = url
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for key, entry in zip(missing, executor.map(self.download, missing.values())):
+                if entry:
+                    self.index[key] = entry
+        self.save_index()
+
+        self.used = {key: self.index[key] for key in images.values() if key in self.index}
+        logging.info(f"Images: {self.stats}")
+        return {url: self.index[key] for url, key in images.items() if key in self.index}
+
+    def download(self, url: str) -> Optional[Dict[str, Any]]:
+        try:
+            response = self.session.get(url, timeout=self.timeout)
+            response.raise_for_status()
+        except requests.RequestException as e:
+            logging.warning(f"Error downloading image {url}: {e}")
+            with self.stats_lock:
+                self.stats['failed'] += 1
+            return None
+        with self.stats_lock:
+            self.stats['downloaded'] += 1
+        return self.store(response.content, self.guess_extension(url, response.headers.get('Content-Type')))
+
+    @staticmethod
+    def guess_extension(url: str, content_type: Optional[str]) -> str:
+        suffix = Path(urlsplit(url).path).suffix.lower()
+        if suffix:
+            return suffix
+        return mimetypes.guess_extension((content_type or '').split(';')[0].strip()) or '.bin'
+
+    def store(self, content: bytes, extension: str) -> Dict[str, Any]:
+        """Сохраняет картинку под именем по хэшу и генерирует WebP-варианты"""
+        digest = hashlib.sha256(content).hexdigest()[:16]
+        name = f"{digest}{extension}"
+        path = self.media_dir / name
+        if not path.exists():
+            path.write_bytes(content)
+
+        entry = {'src': (MEDIA_PREFIX / name).as_posix(), 'srcset': '', 'width': None, 'height': None,
+                 'files': [name]}
+        if Image is None or extension not in RESIZABLE_TYPES:
+            return entry
+
+        try:
+            with Image.open(io.BytesIO(content)) as image:
+                entry['width'], entry['height'] = image.size
+                srcset = []
+                for width in self.widths:
+                    if width >= image.width:
+                        break
+                    variant_name = f"{digest}-{width}.webp"
+                    variant_path = self.media_dir / variant_name
+                    if not variant_path.exists():
+                        height = round(image.height * width / image.width)
+                        image.resize((width, height)).save(variant_path, 'WEBP', quality=80)
+                    entry['files'].append(variant_name)
+                    srcset.append(f"{(MEDIA_PREFIX / variant_name).as_posix()} {width}w")
+                if srcset:
+                    srcset.append(f"{entry['src']} {image.width}w")
+                entry['srcset'] = ', '.join(srcset)
+        except (OSError, ValueError, Image.DecompressionBombError) as e:
+            # Картинка остаётся в build как есть, теряются только варианты
+            logging.warning(f"Cannot generate variants for {name}: {e}")
+            entry.update(srcset='', files=[name])
+        return entry
+
+    def publish(self, file_manager):
+        """Кладёт использованные картинки в build через FileManager (один файл на хэш)"""
+        names = {name for entry in self.used.values() for name in entry['files']}
+        for name in sorted(names):
+            file_manager.add_file(self.media_dir / name, MEDIA_PREFIX / name)
+
+    def prune(self) -> int:
+        """Удаляет из кэша картинки, которые не используются ни одной страницей текущей сборки"""
+        names = {name for entry in self.used.values() for name in entry['files']}
+        removed = 0
+        for path in self.media_dir.iterdir():
+            if path.is_file() and path.name not in names:
+                path.unlink()
+                removed += 1
+        self.index = {key: entry for key, entry in self.index.items() if key in self.used}
+        self.save_index()
+        if removed:
+            logging.info(f"Removed {removed} unused media cache files")
+        return removed
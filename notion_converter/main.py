@@ -1,79 +1,260 @@
-import os
-import logging
-from typing import List, Tuple
-from notion_client import NotionClient
-from template_engine import TemplateEngine
-from html_renderer import HTMLRenderer
-from file_manager import FileManager
-
-def generate_navigation(pages_data: List[Tuple[str, str]], template_engine) -> str:
-    """Генерирует HTML навигацию по страницам"""
-    nav_items = []
-    for title, filename in pages_data:
-        # Используем путь к шаблону для каждого элемента навигации
-        nav_items.append(template_engine.render_page("blocks/navigation_item.html", title=title, url=f"{filename}.html"))
-    return template_engine.render_page("blocks/navigation.html", navigation_items=''.join(nav_items))
-
-
-
-
-def main():
-    # Настройка логирования
-    logging.basicConfig(level=logging.INFO)
-
-    # Загрузка переменных окружения
-    notion_token = os.getenv('NOTION_API_TOKEN')
-    page_ids = os.getenv('NOTION_PAGE_IDS', '').split(',')
-
-    if not notion_token or not page_ids:
-        raise ValueError("Required environment variables are not set")
-
-    try:
-        # Инициализация компонентов
-        notion_client = NotionClient(notion_token)
-        template_engine = TemplateEngine()
-        html_renderer = HTMLRenderer(template_engine)
-        file_manager = FileManager()
-
-        # Обработка страниц
-        pages_data = []
-        
-        for idx, page_id in enumerate(page_ids):
-            logging.info(f"Processing page {page_id}")
-
-            # Получение данных страницы
-            notion_content = notion_client.get_page_content(page_id)
-            html_content = html_renderer.convert_to_html(notion_content)
-            title = notion_client.get_page_title(page_id)
-            toc = html_renderer.generate_toc(notion_content)
-
-            # Генерация имени файла
-            filename = 'index' if idx == 0 else f'page_{idx + 1}'
-            pages_data.append((title, filename))
-
-        # Генерация навигации после обработки всех страниц
-        navigation = generate_navigation(pages_data, template_engine)
-
-        # Сохранение всех страниц с одной и той же навигацией
-        for title, filename in pages_data:
-            notion_content = notion_client.get_page_content(page_id)
-            html_content = html_renderer.convert_to_html(notion_content)
-            toc = html_renderer.generate_toc(notion_content)
-
-            file_manager.save_html(
-                filename,
-                template_engine.render_page('template.html',
-                    title=title,
-                    content=html_content,
-                    toc=toc,
-                    navigation=navigation
-                )
-            )
-
-        logging.info("Sync completed successfully")
-    except Exception as e:
-        logging.error(f"An error occurred: {e}")
-        raise
-
-if __name__ == '__main__':
-    main()
+import os
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from collections import defaultdict
+from typing import List, Dict, Any, Optional, Set, Callable
+from notion_client import NotionClient
+from block_cache import BlockCache
+from image_pipeline import ImagePipeline, MEDIA_PREFIX
+from asset_pipeline import AssetPipeline
+from template_engine import TemplateEngine
+from html_renderer import HTMLRenderer
+from highlighter import Highlighter, STYLESHEET_PATH, pygments
+from document import build_document, Slugs
+from search_index import SearchIndex, SEARCH_PREFIX
+from render_pool import RenderPool, page_context
+from file_manager import FileManager
+from metrics import metrics
+from profiler import ThreadProfiler
+
+def generate_navigation(pages_data: List[Dict[str, Any]], template_engine) -> str:
+    """Генерирует HTML навигацию по страницам с учётом их иерархии"""
+    children = defaultdict(list)
+    for page in pages_data:
+        children[page['parent']].append(page)
+
+    def render_items(parent: Optional[str]) -> str:
+        # Используем путь к шаблону для каждого элемента навигации
+        return ''.join(
+            template_engine.render_page("blocks/navigation_item.html", title=page['title'],
+                                        url=f"{page['filename']}.html", children=render_items(page['id']))
+            for page in children[parent]
+        )
+
+    return template_engine.render_page("blocks/navigation.html", navigation_items=render_items(None))
+
+
+def page_filenames(pages: List[Dict[str, Any]], discovered: bool) -> List[str]:
+    """Имена файлов: первая страница — index; найденные обходом получают слаг заголовка"""
+    if not discovered:
+        return ['index' if idx == 0 else f'page_{idx + 1}' for idx in range(len(pages))]
+    slugs = Slugs(reserved=('index',))
+    return ['index' if idx == 0 else slugs.unique(page['title']) for idx, page in enumerate(pages)]
+
+
+def attach_document(page: Dict[str, Any]) -> Dict[str, Any]:
+    """Сразу заменяет сырой JSON блоков страницы компактным документом"""
+    with metrics.span('document.build'):
+        page['document'] = build_document(page.pop('blocks'))
+    return page
+
+
+def fetch_pages(notion_client: NotionClient, page_ids: List[str], max_workers: int,
+                transform: Callable[[Dict[str, Any]], Dict[str, Any]] = attach_document) -> List[Dict[str, Any]]:
+    """Параллельно загружает страницы, сохраняя порядок page_ids"""
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        return list(executor.map(lambda page_id: transform(notion_client.fetch_page(page_id)), page_ids))
+
+
+def load_settings() -> Dict[str, Any]:
+    """Читает настройки сборки из переменных окружения"""
+    max_workers = int(os.getenv('NOTION_MAX_WORKERS', '8'))
+    cache_dir = os.getenv('NOTION_CACHE_DIR', '.notion_cache')
+    settings = {
+        'notion_token': os.getenv('NOTION_API_TOKEN'),
+        'api_base_url': os.getenv('NOTION_API_BASE_URL', 'https://api.notion.com/v1'),
+        'page_ids': [page_id.strip() for page_id in os.getenv('NOTION_PAGE_IDS', '').split(',') if page_id.strip()],
+        # Корневые страницы для автоматического обхода рабочего пространства (вместо NOTION_PAGE_IDS)
+        'root_ids': [root_id.strip() for root_id in os.getenv('NOTION_ROOT_IDS', '').split(',') if root_id.strip()],
+        'max_workers': max_workers,
+        'requests_per_second': float(os.getenv('NOTION_REQUESTS_PER_SECOND', '3')),
+        'pool_size': int(os.getenv('NOTION_POOL_SIZE', str(max(10, max_workers)))),
+        'cache_dir': cache_dir,
+        'bytecode_cache_dir': os.path.join(cache_dir, 'templates') if cache_dir else None,
+        'stream_output': os.getenv('NOTION_STREAM_OUTPUT', '') == '1',
+        # Число процессов рендеринга; 0 или 1 — рендеринг в текущем процессе
+        'render_processes': int(os.getenv('NOTION_RENDER_PROCESSES', '0')),
+        'incremental_build': os.getenv('NOTION_INCREMENTAL_BUILD', '1') == '1',
+        'mirror_images': os.getenv('NOTION_MIRROR_IMAGES', '1') == '1',
+        'optimize_assets': os.getenv('NOTION_OPTIMIZE_ASSETS', '1') == '1',
+        'precompress': os.getenv('NOTION_PRECOMPRESS', '') == '1',
+        'build_search_index': os.getenv('NOTION_SEARCH_INDEX', '1') == '1',
+        # Подсветка кода при сборке (нужен Pygments) и стиль Pygments для highlight.css
+        'highlight_code': os.getenv('NOTION_HIGHLIGHT_CODE', '1') == '1',
+        'highlight_style': os.getenv('NOTION_HIGHLIGHT_STYLE', 'default'),
+        'metrics_path': os.getenv('NOTION_METRICS_PATH', 'sync-metrics.json'),
+        'profile_path': os.getenv('NOTION_PROFILE'),
+    }
+    if not settings['notion_token'] or not (settings['page_ids'] or settings['root_ids']):
+        raise ValueError("Required environment variables are not set")
+    return settings
+
+
+def create_client(settings: Dict[str, Any]) -> NotionClient:
+    return NotionClient(settings['notion_token'], requests_per_second=settings['requests_per_second'],
+                        pool_size=settings['pool_size'], max_workers=settings['max_workers'],
+                        cache=BlockCache(settings['cache_dir']) if settings['cache_dir'] else None,
+                        base_url=settings['api_base_url'])
+
+
+def fetch_site(notion_client: NotionClient, settings: Dict[str, Any],
+               transform: Callable[[Dict[str, Any]], Dict[str, Any]] = attach_document) -> List[Dict[str, Any]]:
+    """Загружает все страницы сайта: обходом от NOTION_ROOT_IDS или по списку NOTION_PAGE_IDS"""
+    with metrics.span('phase.fetch'):
+        if settings['root_ids']:
+            return notion_client.discover_pages(settings['root_ids'], transform=transform)
+        return fetch_pages(notion_client, settings['page_ids'], settings['max_workers'], transform)
+
+
+def build_site(settings: Dict[str, Any], pages: List[Dict[str, Any]], render_only: Optional[Set[str]] = None,
+               keep_documents: bool = False) -> List[Dict[str, Any]]:
+    """Собирает build из загруженных страниц.
+
+    render_only — id страниц, которые нужно перерендерить; HTML остальных берётся из предыдущей сборки.
+    keep_documents — не освобождать документы страниц (нужно режиму наблюдения).
+    """
+    # Инициализация компонентов
+    template_engine = TemplateEngine(bytecode_cache_dir=settings['bytecode_cache_dir'])
+    highlighter = None
+    if settings['highlight_code']:
+        if pygments:
+            highlighter = Highlighter(os.path.join(settings['cache_dir'] or '.notion_cache', 'highlight'),
+                                      style=settings['highlight_style'])
+        else:
+            logging.warning("Pygments is not installed, code blocks will not be highlighted")
+    html_renderer = HTMLRenderer(template_engine, highlighter)
+    with metrics.span('phase.assets'):
+        file_manager = FileManager(incremental=settings['incremental_build'],
+                                   copy_assets=not settings['optimize_assets'])
+        if settings['optimize_assets']:
+            asset_pipeline = AssetPipeline()
+            template_engine.asset_urls = asset_pipeline.build(file_manager)
+        if highlighter:
+            # Одна сгенерированная таблица стилей для токенов всех блоков кода
+            if settings['optimize_assets']:
+                asset_pipeline.emit(file_manager, STYLESHEET_PATH,
+                                    AssetPipeline.minify_css(highlighter.stylesheet()))
+            else:
+                file_manager.save_bytes(STYLESHEET_PATH, highlighter.stylesheet().encode('utf-8'))
+
+    pages_data = [
+        {'id': page['id'], 'title': page['title'], 'filename': filename, 'parent': page.get('parent')}
+        for page, filename in zip(pages, page_filenames(pages, discovered=bool(settings['root_ids'])))
+    ]
+
+    # Подписанные ссылки Notion на картинки истекают через час, поэтому храним копии в build
+    if settings['mirror_images']:
+        with metrics.span('phase.images'):
+            image_pipeline = ImagePipeline(settings['cache_dir'] or '.notion_cache',
+                                           max_workers=settings['max_workers'])
+            html_renderer.images = image_pipeline.process(pages)
+            image_pipeline.publish(file_manager)
+            # Только при полной сборке: набор картинок известен по всем страницам
+            if render_only is None:
+                image_pipeline.prune()
+        metrics.update('images', image_pipeline.stats)
+
+    html_renderer.page_urls = {page['id'].replace('-', ''): f"{page['filename']}.html" for page in pages_data}
+
+    # Навигация известна только после загрузки всех страниц
+    navigation = generate_navigation(pages_data, template_engine)
+    search_index = SearchIndex() if settings['build_search_index'] else None
+
+    shared_context = {
+        'navigation': navigation,
+        'search_index': f"{SEARCH_PREFIX}/manifest.json" if search_index else None,
+        'highlight_css': STYLESHEET_PATH if highlighter else None,
+    }
+
+    def page_documents():
+        for page_data, page in zip(pages_data, pages):
+            if search_index:
+                with metrics.span('phase.search_index'):
+                    search_index.add_page(page_data['filename'], page_data['title'], page['document'])
+            if (render_only is not None and page['id'] not in render_only
+                    and file_manager.keep_previous(f"{page_data['filename']}.html")):
+                continue
+            # Документ забирается из списка страниц, чтобы освободить память сразу после рендеринга
+            document = page['document'] if keep_documents else page.pop('document')
+            yield page_data['filename'], page_data['title'], document
+
+    if settings['render_processes'] > 1:
+        render_pool = RenderPool(settings['render_processes'], html_renderer, settings['bytecode_cache_dir'],
+                                 shared_context)
+        try:
+            with metrics.span('phase.render_pool'):
+                for filename, html in render_pool.render(page_documents()):
+                    with metrics.span('phase.write'):
+                        file_manager.save_html(filename, html)
+        finally:
+            render_pool.close()
+    else:
+        for filename, title, document in page_documents():
+            context = page_context(html_renderer, title, document, shared_context)
+            if settings['stream_output']:
+                # Тело страницы генерируется по блокам и сразу пишется в файл
+                with metrics.span('phase.render_write'):
+                    file_manager.save_html_stream(filename, template_engine.stream_page('template.html', **context))
+            else:
+                with metrics.span('phase.render'):
+                    html = template_engine.render_page('template.html', **context)
+                with metrics.span('phase.write'):
+                    file_manager.save_html(filename, html)
+
+    if search_index:
+        with metrics.span('phase.search_index'):
+            metrics.update('search', search_index.write(file_manager))
+
+    with metrics.span('phase.finalize'):
+        if settings['optimize_assets']:
+            asset_pipeline.write_headers(file_manager, extra_immutable=[
+                f"/{MEDIA_PREFIX.as_posix()}/*", f"/{SEARCH_PREFIX}/shards/*", f"/{SEARCH_PREFIX}/docs/*"])
+        if settings['precompress']:
+            AssetPipeline.precompress(file_manager)
+        file_manager.finalize()
+
+    if highlighter:
+        metrics.update('highlight', highlighter.stats)
+        if render_only is None:
+            highlighter.prune()
+    metrics.update('render.blocks', html_renderer.block_counts)
+    if html_renderer.unhandled:
+        metrics.update('render.unhandled', html_renderer.unhandled)
+        logging.warning(f"Unhandled block types: {dict(html_renderer.unhandled)}")
+    return pages_data
+
+
+def main():
+    # Настройка логирования
+    logging.basicConfig(level=logging.INFO)
+
+    # Загрузка переменных окружения
+    settings = load_settings()
+    profile_path = settings['profile_path']
+
+    metrics.reset()
+    profiler = ThreadProfiler() if profile_path else None
+    if profiler:
+        profiler.start()
+
+    try:
+        notion_client = create_client(settings)
+        # Обработка страниц: каждая страница загружается и рендерится ровно один раз
+        pages = fetch_site(notion_client, settings)
+        build_site(settings, pages)
+        logging.info(f"Notion API stats: {notion_client.stats}")
+        notion_client.close()
+        logging.info("Sync completed successfully")
+    except Exception as e:
+        logging.error(f"An error occurred: {e}")
+        raise
+    finally:
+        if profiler:
+            threads = profiler.stop(profile_path)
+            logging.info(f"Profile of {threads} thread(s) written to {profile_path}")
+        if settings['metrics_path']:
+            metrics.write_report(settings['metrics_path'])
+            logging.info(f"Metrics written to {settings['metrics_path']}")
+
+if __name__ == '__main__':
+    main()
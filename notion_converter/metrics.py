@@ -0,0 +1,102 @@
+import json
+import time
+import bisect
+import threading
+from pathlib import Path
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, Any, Iterator, Tuple
+
+# Верхние границы корзин гистограмм, в секундах
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def to_dict(self) -> Dict[str, Any]:
+        labels = [f"le_{bound}" for bound in self.buckets] + ['le_inf']
+        return {
+            'count': self.count,
+            'total': round(self.total, 6),
+            'mean': round(self.total / self.count, 6) if self.count else 0.0,
+            'max': round(self.max, 6),
+            'buckets': dict(zip(labels, self.counts)),
+        }
+
+
+class Metrics:
+    """Потокобезопасные счётчики, таймеры фаз и гистограммы задержек одного запуска"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.started_at = time.time()
+            self.counters = Counter()
+            self.spans: Dict[str, Dict[str, float]] = {}
+            self.histograms: Dict[str, Histogram] = {}
+
+    def incr(self, name: str, value: float = 1):
+        with self.lock:
+            self.counters[name] += value
+
+    def update(self, prefix: str, values: Dict[str, float]):
+        """Добавляет словарь счётчиков с общим префиксом (например, блоки по типам)"""
+        with self.lock:
+            for key, value in values.items():
+                self.counters[f"{prefix}.{key}"] += value
+
+    def observe(self, name: str, value: float):
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.observe(value)
+
+    @contextmanager
+    def span(self, name: str) -> Iterator[None]:
+        """Замеряет время фазы; повторные вызовы суммируются"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            with self.lock:
+                span = self.spans.setdefault(name, {'count': 0, 'seconds': 0.0})
+                span['count'] += 1
+                span['seconds'] += elapsed
+
+    def report(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                'started_at': self.started_at,
+                'duration_seconds': round(time.time() - self.started_at, 6),
+                'spans': {name: {'count': span['count'], 'seconds': round(span['seconds'], 6)}
+                          for name, span in sorted(self.spans.items())},
+                'counters': dict(sorted(self.counters.items())),
+                'histograms': {name: histogram.to_dict() for name, histogram in sorted(self.histograms.items())},
+            }
+
+    def write_report(self, path: str):
+        output_path = Path(path)
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(output_path, 'w', encoding='utf-8') as f:
+            json.dump(self.report(), f, indent=2)
+
+
+# Общий экземпляр на процесс: модули пишут в него без явной передачи
+metrics = Metrics()
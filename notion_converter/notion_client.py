@@ -1,70 +1,431 @@
-import os
-import requests
-import logging
-from typing import List, Dict, Any
-
-class NotionClient:
-    def __init__(self, token: str):
-        self.headers = {
-            "Authorization": f"Bearer {token}",
-            "Notion-Version": "2022-06-28"
-        }
-        self.base_url = "https://api.notion.com/v1"
-
-    def get_page_content(self, page_id: str) -> List[Dict[str, Any]]:
-        """Получает содержимое страницы Notion"""
-        url = f"{self.base_url}/blocks/{page_id}/children"
-        all_blocks = []
-        has_more = True
-        start_cursor = None
-
-        while has_more:
-            try:
-                params = {"page_size": 100}
-                if start_cursor:
-                    params["start_cursor"] = start_cursor
-
-                response = requests.get(url, headers=self.headers, params=params)
-                response.raise_for_status()
-                data = response.json()
-
-                all_blocks.extend(data.get('results', []))
-                has_more = data.get('has_more', False)
-                start_cursor = data.get('next_cursor')
-
-                logging.info(f"Fetched {len(data.get('results', []))} blocks. Total: {len(all_blocks)}")
-
-            except requests.RequestException as e:
-                logging.error(f"Error fetching Notion content: {e}")
-                raise
-
-        return all_blocks
-
-    def get_page_title(self, page_id: str) -> str:
-        """Получает заголовок страницы"""
-        try:
-            url = f"{self.base_url}/pages/{page_id}"
-            response = requests.get(url, headers=self.headers)
-            response.raise_for_status()
-            page_data = response.json()
-
-            title_property = page_data.get("properties", {}).get("title", {}).get("title", [])
-            if title_property:
-                return title_property[0].get("text", {}).get("content", "Untitled")
-
-            return "Untitled"
-
-        except requests.RequestException as e:
-            logging.error(f"Error fetching page title: {e}")
-            return "Untitled"
-
-    def get_block_children(self, block_id: str) -> List[Dict[str, Any]]:
-        """Получает дочерние блоки"""
-        url = f"{self.base_url}/blocks/{block_id}/children"
-        try:
-            response = requests.get(url, headers=self.headers)
-            response.raise_for_status()
-            return response.json().get('results', [])
-        except requests.RequestException as e:
-            logging.error(f"Error fetching child blocks: {e}")
-            return []
\ No newline at end of file
+import os
+import time
+import random
+import threading
+import requests
+import logging
+from collections import defaultdict
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+from requests.adapters import HTTPAdapter
+from urllib3.util import make_headers
+from typing import List, Dict, Any, Optional, Tuple, Callable
+from block_cache import BlockCache
+from metrics import metrics
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# Дочерние блоки этих типов — отдельные страницы/базы, их не разворачиваем в дерево
+NON_EXPANDABLE_TYPES = {'child_page', 'child_database'}
+# last_edited_time в Notion округляется до минуты: правки внутри той же минуты не меняют его.
+# Копии, снятые раньше чем через SETTLE_SECONDS после last_edited_time, не считаются окончательными.
+SETTLE_SECONDS = 120
+# Блоки с файлами: у загруженных в Notion файлов подписанная ссылка живёт около часа
+FILE_BLOCK_TYPES = {'image', 'file', 'pdf', 'video', 'audio'}
+# Ссылки, истекающие раньше чем через столько секунд, обновляются даже у неизменённых страниц
+FILE_URL_MARGIN_SECONDS = 600
+
+
+def parse_time(value: str) -> datetime:
+    return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+
+class TokenBucket:
+    """Потокобезопасный token bucket для ограничения частоты запросов"""
+
+    def __init__(self, rate: float, capacity: float = 1.0):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """Забирает один токен, при необходимости ожидая. Возвращает время ожидания"""
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+    def pause(self, seconds: float):
+        """Блокирует выдачу токенов на заданное время (Retry-After)"""
+        with self.lock:
+            # Сначала начисляем токены по текущий момент: иначе acquire() зачтёт время ответа
+            # с 429 как накопленное и сократит (или отменит) паузу
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+            self.updated_at = now
+            self.tokens = min(self.tokens, 1.0 - seconds * self.rate)
+
+
+class NotionClient:
+    def __init__(self, token: str, requests_per_second: float = 3.0, max_retries: int = 5,
+                 backoff_base: float = 0.5, backoff_max: float = 30.0, pool_size: int = 10,
+                 timeout: Tuple[float, float] = (5.0, 30.0), max_workers: int = 8,
+                 cache: Optional[BlockCache] = None, base_url: str = "https://api.notion.com/v1"):
+        self.headers = {
+            "Authorization": f"Bearer {token}",
+            "Notion-Version": "2022-06-28",
+            # gzip/deflate, плюс br если установлен brotli
+            "Accept-Encoding": make_headers(accept_encoding=True)['accept-encoding'],
+        }
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.max_workers = max(1, max_workers)
+        self.cache = cache
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        # pool_block: лишние потоки ждут свободное соединение, а не открывают одноразовые
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, pool_block=True)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.rate_limiter = TokenBucket(requests_per_second)
+        self.stats = {'requests': 0, 'retries': 0, 'sleeps': 0, 'sleep_seconds': 0.0, 'page_cache_hits': 0,
+                      'file_urls_refreshed': 0}
+        self.stats_lock = threading.Lock()
+
+    def close(self):
+        """Закрывает HTTP-сессию и пул соединений"""
+        self.session.close()
+
+    def _count(self, **increments):
+        with self.stats_lock:
+            for key, value in increments.items():
+                self.stats[key] += value
+        metrics.update('notion', increments)
+
+    def _retry_delay(self, response: Optional[requests.Response], attempt: int) -> float:
+        """Задержка перед повтором: Retry-After или экспоненциальный backoff с jitter"""
+        if response is not None and response.headers.get('Retry-After'):
+            try:
+                return float(response.headers['Retry-After'])
+            except ValueError:
+                pass
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def _request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """Выполняет запрос к API с учётом лимита частоты и повторами на 429/5xx"""
+        attempt = 0
+        while True:
+            waited = self.rate_limiter.acquire()
+            if waited:
+                self._count(sleeps=1, sleep_seconds=waited)
+            self._count(requests=1)
+
+            kwargs.setdefault('timeout', self.timeout)
+            started = time.perf_counter()
+            response = self.session.request(method, url, **kwargs)
+            metrics.observe('notion.request_seconds', time.perf_counter() - started)
+            metrics.incr(f"notion.status.{response.status_code}")
+            metrics.incr('notion.bytes_received', len(response.content))
+            if response.status_code not in RETRY_STATUS_CODES or attempt >= self.max_retries:
+                response.raise_for_status()
+                return response
+
+            delay = self._retry_delay(response, attempt)
+            logging.warning(f"Notion API returned {response.status_code} for {url}, retrying in {delay:.1f}s")
+            self._count(retries=1)
+            if response.status_code == 429:
+                # Приостанавливаем все потоки: ожидание произойдёт в acquire()
+                self.rate_limiter.pause(delay)
+            else:
+                self._count(sleeps=1, sleep_seconds=delay)
+                time.sleep(delay)
+            attempt += 1
+
+    def get_page_content(self, page_id: str) -> List[Dict[str, Any]]:
+        """Получает содержимое страницы Notion (все страницы пагинации)"""
+        url = f"{self.base_url}/blocks/{page_id}/children"
+        all_blocks = []
+        has_more = True
+        start_cursor = None
+
+        while has_more:
+            try:
+                params = {"page_size": 100}
+                if start_cursor:
+                    params["start_cursor"] = start_cursor
+
+                response = self._request('GET', url, params=params)
+                data = response.json()
+
+                all_blocks.extend(data.get('results', []))
+                has_more = data.get('has_more', False)
+                start_cursor = data.get('next_cursor')
+
+                logging.info(f"Fetched {len(data.get('results', []))} blocks. Total: {len(all_blocks)}")
+
+            except requests.RequestException as e:
+                logging.error(f"Error fetching Notion content: {e}")
+                raise
+
+        return all_blocks
+
+    def get_page(self, page_id: str) -> Dict[str, Any]:
+        """Получает метаданные страницы (свойства, last_edited_time)"""
+        response = self._request('GET', f"{self.base_url}/pages/{page_id}")
+        return response.json()
+
+    @staticmethod
+    def extract_title(page_data: Dict[str, Any]) -> str:
+        """Извлекает заголовок из свойств страницы"""
+        for prop in page_data.get("properties", {}).values():
+            if prop.get("type") == "title" or "title" in prop:
+                title = ''.join(t.get('plain_text') or t.get('text', {}).get('content', '')
+                                for t in prop.get("title", []))
+                if title:
+                    return title
+        return "Untitled"
+
+    def get_page_title(self, page_id: str) -> str:
+        """Получает заголовок страницы"""
+        try:
+            return self.extract_title(self.get_page(page_id))
+        except requests.RequestException as e:
+            logging.error(f"Error fetching page title: {e}")
+            return "Untitled"
+
+    def fetch_page(self, page_id: str, page_data: Optional[Dict[str, Any]] = None,
+                   refresh: bool = False) -> Dict[str, Any]:
+        """Загружает страницу целиком, используя кэш по last_edited_time.
+
+        page_data — уже полученный объект страницы (например, из запроса к базе данных или поиска).
+        refresh — не доверять кэшу. Копия, снятая в течение SETTLE_SECONDS после правки,
+        не используется и без этого флага: правка в ту же минуту не изменила бы last_edited_time.
+        """
+        logging.info(f"Processing page {page_id}")
+        started = time.perf_counter()
+        try:
+            return self._fetch_page(page_id, page_data, refresh)
+        finally:
+            metrics.observe('notion.page_fetch_seconds', time.perf_counter() - started)
+
+    def _fetch_page(self, page_id: str, page_data: Optional[Dict[str, Any]] = None,
+                    refresh: bool = False) -> Dict[str, Any]:
+        if page_data is None:
+            page_data = self.get_page(page_id)
+        last_edited_time = page_data.get('last_edited_time')
+        cached = self.cache.get(page_id) if self.cache and not refresh else None
+
+        if (cached and last_edited_time and cached.get('last_edited_time') == last_edited_time
+                and cached.get('fetched_at', 0) - parse_time(last_edited_time).timestamp() >= SETTLE_SECONDS):
+            try:
+                if self.refresh_file_urls(cached['blocks']):
+                    self.cache.put(page_id, cached)
+                logging.info(f"Page {page_id} unchanged since {last_edited_time}, using cache")
+                self._count(page_cache_hits=1)
+                return cached
+            except requests.RequestException as e:
+                # Без свежих ссылок копия бесполезна: загружаем страницу целиком
+                logging.warning(f"Error refreshing file URLs of page {page_id}: {e}")
+
+        page = {
+            'id': page_id,
+            'title': self.extract_title(page_data),
+            'last_edited_time': last_edited_time,
+            'fetched_at': time.time(),
+            'blocks': self.get_block_tree(page_id),
+        }
+        if self.cache:
+            self.cache.put(page_id, page)
+        return page
+
+    def get_block(self, block_id: str) -> Dict[str, Any]:
+        """Получает один блок"""
+        response = self._request('GET', f"{self.base_url}/blocks/{block_id}")
+        return response.json()
+
+    @staticmethod
+    def find_expiring_files(blocks: List[Dict[str, Any]], deadline: float) -> List[Dict[str, Any]]:
+        """Блоки с загруженными в Notion файлами, чья ссылка истекает раньше deadline"""
+        found = []
+        stack = list(blocks)
+        while stack:
+            block = stack.pop()
+            data = block.get(block.get('type')) or {}
+            if block.get('type') in FILE_BLOCK_TYPES and data.get('type') == 'file':
+                expiry_time = (data.get('file') or {}).get('expiry_time')
+                if not expiry_time or parse_time(expiry_time).timestamp() < deadline:
+                    found.append(block)
+            stack.extend(block.get('children', []))
+        return found
+
+    def refresh_file_urls(self, blocks: List[Dict[str, Any]]) -> int:
+        """Перезапрашивает блоки с истекающими ссылками на файлы; возвращает число обновлённых"""
+        expiring = self.find_expiring_files(blocks, time.time() + FILE_URL_MARGIN_SECONDS)
+        if not expiring:
+            return 0
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for block, fresh in zip(expiring, executor.map(lambda block: self.get_block(block['id']), expiring)):
+                block[block['type']] = fresh[block['type']]
+        self._count(file_urls_refreshed=len(expiring))
+        return len(expiring)
+
+    def query_database(self, database_id: str) -> List[Dict[str, Any]]:
+        """Получает все страницы базы данных (все страницы пагинации)"""
+        url = f"{self.base_url}/databases/{database_id}/query"
+        payload: Dict[str, Any] = {"page_size": 100}
+        results = []
+        while True:
+            data = self._request('POST', url, json=payload).json()
+            results.extend(data.get('results', []))
+            if not data.get('has_more'):
+                return results
+            payload["start_cursor"] = data.get('next_cursor')
+
+    def search_pages(self, edited_since: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Страницы из /search, от последних изменённых; пагинация останавливается на edited_since"""
+        url = f"{self.base_url}/search"
+        payload: Dict[str, Any] = {
+            "filter": {"property": "object", "value": "page"},
+            "sort": {"direction": "descending", "timestamp": "last_edited_time"},
+            "page_size": 100,
+        }
+        results = []
+        while True:
+            data = self._request('POST', url, json=payload).json()
+            for page_data in data.get('results', []):
+                # Время в формате ISO 8601 одной длины, поэтому строки сравниваются корректно
+                if edited_since and page_data.get('last_edited_time', '') < edited_since:
+                    return results
+                results.append(page_data)
+            if not data.get('has_more'):
+                return results
+            payload["start_cursor"] = data.get('next_cursor')
+
+    @staticmethod
+    def find_child_pages(blocks: List[Dict[str, Any]]) -> List[Tuple[str, str]]:
+        """(тип, id) блоков child_page/child_database дерева в порядке появления на странице"""
+        found = []
+        stack = list(reversed(blocks))
+        while stack:
+            block = stack.pop()
+            if block.get('type') in NON_EXPANDABLE_TYPES:
+                found.append((block['type'], block['id']))
+            stack.extend(reversed(block.get('children', [])))
+        return found
+
+    def discover_pages(self, root_ids: List[str],
+                       transform: Optional[Callable[[Dict[str, Any]], Dict[str, Any]]] = None
+                       ) -> List[Dict[str, Any]]:
+        """Обходит рабочее пространство от корневых страниц (не баз) по child_page/child_database.
+
+        Страницы и запросы к базам данных выполняются параллельно по мере обнаружения,
+        каждый объект — ровно один раз. Возвращает страницы в порядке обхода в глубину
+        с полями 'parent' (id родительской страницы) и 'depth'. transform применяется
+        к странице в рабочем потоке сразу после поиска вложенных страниц.
+        """
+        visited = set()
+        pages: Dict[str, Dict[str, Any]] = {}
+        # id страницы или базы -> упорядоченные id вложенных объектов; None — корни
+        children: Dict[Optional[str], List[str]] = defaultdict(list)
+        pending: Dict[Future, Tuple[str, str, bool]] = {}
+
+        def crawl_page(page_id: str, page_data: Optional[Dict[str, Any]]):
+            page = self.fetch_page(page_id, page_data)
+            found = self.find_child_pages(page['blocks'])
+            return (transform(page) if transform else page), found
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            def schedule(kind: str, object_id: str, parent: Optional[str],
+                         page_data: Optional[Dict[str, Any]] = None):
+                key = object_id.replace('-', '')
+                if key in visited:
+                    return
+                visited.add(key)
+                # Место в иерархии резервируется сразу, чтобы порядок не зависел от скорости ответов
+                children[parent].append(key)
+                if kind == 'child_database':
+                    future = executor.submit(self.query_database, object_id)
+                else:
+                    future = executor.submit(crawl_page, object_id, page_data)
+                pending[future] = (kind, key, parent is None)
+
+            for root_id in root_ids:
+                schedule('child_page', root_id, None)
+
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    kind, key, is_root = pending.pop(future)
+                    try:
+                        result = future.result()
+                    except requests.RequestException as e:
+                        if is_root:
+                            raise
+                        # Интеграции часто не выдан доступ к части вложенных страниц
+                        logging.warning(f"Skipping {kind} {key}: {e}")
+                        metrics.incr('notion.discovery_skipped')
+                        continue
+                    if kind == 'child_database':
+                        metrics.incr('notion.databases_discovered')
+                        for page_data in result:
+                            schedule('child_page', page_data['id'], key, page_data)
+                    else:
+                        pages[key], found = result
+                        for child_kind, child_id in found:
+                            schedule(child_kind, child_id, key)
+
+        ordered = []
+
+        def flatten(parent: Optional[str], page_parent: Optional[str], depth: int):
+            for key in children.get(parent, []):
+                page = pages.get(key)
+                if page is None:
+                    # База данных прозрачна: её страницы становятся детьми страницы, где она лежит
+                    flatten(key, page_parent, depth)
+                    continue
+                page['parent'] = pages[page_parent]['id'] if page_parent else None
+                page['depth'] = depth
+                ordered.append(page)
+                flatten(key, key, depth + 1)
+
+        flatten(None, None, 0)
+        metrics.incr('notion.pages_discovered', len(ordered))
+        logging.info(f"Discovered {len(ordered)} pages under {len(root_ids)} root(s)")
+        return ordered
+
+    def get_block_children(self, block_id: str) -> List[Dict[str, Any]]:
+        """Получает дочерние блоки"""
+        try:
+            return self.get_page_content(block_id)
+        except requests.RequestException as e:
+            logging.error(f"Error fetching child blocks: {e}")
+            return []
+
+    def get_block_tree(self, block_id: str) -> List[Dict[str, Any]]:
+        """Загружает полное дерево блоков: уровень за уровнем, соседние поддеревья параллельно.
+
+        Дочерние блоки сохраняются в поле 'children' родительского блока. Поддеревья изменённой
+        страницы всегда загружаются заново: правка вложенного блока не меняет last_edited_time
+        родителя, поэтому по нему нельзя решить, что поддерево не изменилось.
+        """
+        blocks = self.get_page_content(block_id)
+        level = [block for block in blocks if self._is_expandable(block)]
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while level:
+                metrics.incr('notion.child_lists_fetched', len(level))
+                children_lists = executor.map(lambda block: self.get_page_content(block['id']), level)
+                next_level = []
+                for block, children in zip(level, children_lists):
+                    block['children'] = children
+                    next_level.extend(child for child in children if self._is_expandable(child))
+                level = next_level
+
+        return blocks
+
+    @staticmethod
+    def _is_expandable(block: Dict[str, Any]) -> bool:
+        return block.get('has_children', False) and block.get('type') not in NON_EXPANDABLE_TYPES
\ No newline at end of file
@@ -0,0 +1,44 @@
+import sys
+import pstats
+import cProfile
+import threading
+from typing import List
+
+
+class ThreadProfiler:
+    """cProfile для всей сборки, включая потоки ThreadPoolExecutor.
+
+    До Python 3.12 cProfile.Profile видит только поток, который его включил, а загрузка страниц,
+    поиск вложенных страниц и построение документов идут в рабочих потоках. Каждый поток,
+    запущенный после start(), получает собственный профайлер; при записи статистика суммируется.
+    Процессы рендеринга (NOTION_RENDER_PROCESSES > 1) в профиль не попадают.
+    """
+
+    def __init__(self):
+        self.profiler = cProfile.Profile()
+        self.thread_profilers: List[cProfile.Profile] = []
+        # С 3.12 cProfile работает через sys.monitoring и сам охватывает все потоки
+        self.per_thread = sys.version_info < (3, 12)
+
+    def start_thread(self, frame, event, arg):
+        # Вызывается на первом событии нового потока; enable() заменяет этот хук профайлером
+        profiler = cProfile.Profile()
+        self.thread_profilers.append(profiler)
+        profiler.enable()
+
+    def start(self):
+        if self.per_thread:
+            threading.setprofile(self.start_thread)
+        self.profiler.enable()
+
+    def stop(self, path: str) -> int:
+        """Останавливает профилирование и пишет сводную статистику; возвращает число потоков"""
+        self.profiler.disable()
+        if self.per_thread:
+            threading.setprofile(None)
+        stats = pstats.Stats(self.profiler)
+        for profiler in self.thread_profilers:
+            profiler.disable()
+            stats.add(profiler)
+        stats.dump_stats(path)
+        return 1 + len(self.thread_profilers)
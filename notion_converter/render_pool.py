@@ -0,0 +1,91 @@
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor, Future
+from typing import Dict, Any, Iterable, Iterator, Tuple, Optional, Deque
+from template_engine import TemplateEngine
+from html_renderer import HTMLRenderer
+from highlighter import Highlighter
+from document import Document
+
+# Состояние процесса-воркера: TemplateEngine и скомпилированные шаблоны создаются один раз
+worker: Dict[str, Any] = {}
+
+
+def page_context(html_renderer: HTMLRenderer, title: str, document: Document,
+                 shared_context: Dict[str, Any]) -> Dict[str, Any]:
+    """Контекст template.html; общий для последовательного и параллельного рендеринга"""
+    return {
+        'title': title,
+        'content': html_renderer.iter_html(document.nodes),
+        'toc': html_renderer.generate_toc(document),
+        **shared_context,
+    }
+
+
+def init_worker(bytecode_cache_dir: Optional[str], asset_urls: Dict[str, str],
+                images: Dict[str, Dict[str, Any]], page_urls: Dict[str, str], shared_context: Dict[str, Any],
+                highlight: Optional[Tuple[str, str]]):
+    template_engine = TemplateEngine(bytecode_cache_dir=bytecode_cache_dir)
+    template_engine.asset_urls = asset_urls
+    # Воркеры пользуются общим дисковым кэшем подсветки (каталог, стиль)
+    html_renderer = HTMLRenderer(template_engine, Highlighter(*highlight) if highlight else None)
+    html_renderer.images = images
+    html_renderer.page_urls = page_urls
+    worker.update(template_engine=template_engine, html_renderer=html_renderer, shared_context=shared_context)
+
+
+def render_in_worker(title: str, document: Document) -> Tuple[str, Counter, Counter, Counter]:
+    """Рендерит страницу в воркере; возвращает HTML и счётчики блоков и подсветки этой страницы"""
+    html_renderer = worker['html_renderer']
+    html_renderer.block_counts.clear()
+    html_renderer.unhandled.clear()
+    highlighter = html_renderer.highlighter
+    if highlighter:
+        highlighter.stats = dict.fromkeys(highlighter.stats, 0)
+    context = page_context(html_renderer, title, document, worker['shared_context'])
+    html = worker['template_engine'].render_page('template.html', **context)
+    highlight_stats = Counter(highlighter.stats) if highlighter else Counter()
+    return html, Counter(html_renderer.block_counts), Counter(html_renderer.unhandled), highlight_stats
+
+
+class RenderPool:
+    """Рендерит страницы в нескольких процессах; HTML записывает родительский процесс"""
+
+    def __init__(self, processes: int, html_renderer: HTMLRenderer, bytecode_cache_dir: Optional[str],
+                 shared_context: Dict[str, Any]):
+        self.processes = processes
+        self.html_renderer = html_renderer
+        highlighter = html_renderer.highlighter
+        self.executor = ProcessPoolExecutor(
+            max_workers=processes,
+            initializer=init_worker,
+            initargs=(bytecode_cache_dir, html_renderer.template_engine.asset_urls, html_renderer.images,
+                      html_renderer.page_urls, shared_context,
+                      (str(highlighter.cache_dir), highlighter.style) if highlighter else None),
+        )
+
+    def render(self, pages: Iterable[Tuple[str, str, Document]]) -> Iterator[Tuple[str, str]]:
+        """Принимает (filename, title, document), отдаёт (filename, html) в исходном порядке.
+
+        В очереди держится не больше двух страниц на процесс, чтобы документы не копились в памяти.
+        """
+        in_flight: Deque[Tuple[str, Future]] = deque()
+        for filename, title, document in pages:
+            in_flight.append((filename, self.executor.submit(render_in_worker, title, document)))
+            if len(in_flight) >= self.processes * 2:
+                yield self.collect(*in_flight.popleft())
+        while in_flight:
+            yield self.collect(*in_flight.popleft())
+
+    def collect(self, filename: str, future: Future) -> Tuple[str, str]:
+        html, block_counts, unhandled, highlight_stats = future.result()
+        # Счётчики воркеров сводятся в общий рендерер, как при последовательном проходе
+        self.html_renderer.block_counts.update(block_counts)
+        self.html_renderer.unhandled.update(unhandled)
+        if self.html_renderer.highlighter:
+            stats = self.html_renderer.highlighter.stats
+            for key, value in highlight_stats.items():
+                stats[key] = stats.get(key, 0) + value
+        return filename, html
+
+    def close(self):
+        self.executor.shutdown()
@@ -0,0 +1,86 @@
+from functools import lru_cache
+from html import escape
+from typing import List, Dict, Any, Tuple
+
+# Порядок вложенности тегов аннотаций: code внутри, остальные снаружи
+ANNOTATION_TAGS = (
+    ('bold', '<strong>', '</strong>'),
+    ('italic', '<em>', '</em>'),
+    ('strikethrough', '<s>', '</s>'),
+    ('underline', '<u>', '</u>'),
+    ('code', '<code>', '</code>'),
+)
+ANNOTATION_NAMES = tuple(name for name, _, _ in ANNOTATION_TAGS)
+PLAIN = ('', '')
+
+
+@lru_cache(maxsize=None)
+def annotation_fragments(flags: Tuple[bool, ...], color: str) -> Tuple[str, str]:
+    """Открывающие и закрывающие теги для комбинации аннотаций (вычисляются один раз)"""
+    opening = []
+    closing = []
+    if color and color != 'default':
+        opening.append(f'<span class="notion-{escape(color)}">')
+        closing.append('</span>')
+    if not any(flags) and not opening:
+        return PLAIN
+    for enabled, (_, open_tag, close_tag) in zip(flags, ANNOTATION_TAGS):
+        if enabled:
+            opening.append(open_tag)
+            closing.append(close_tag)
+    return ''.join(opening), ''.join(reversed(closing))
+
+
+def escape_text(text: str) -> str:
+    """Экранирует текст фрагмента; переводы строк Notion превращаются в <br>"""
+    return escape(text, quote=False).replace('\n', '<br>')
+
+
+def span_text(span: Dict[str, Any]) -> str:
+    text = span.get('plain_text')
+    if text is None:
+        text = (span.get(span.get('type') or 'text') or {}).get('content', '')
+    return text
+
+
+def plain_text(rich_text: List[Dict[str, Any]]) -> str:
+    """Текст без разметки (для заголовков, якорей и поиска)"""
+    return ''.join(span_text(span) for span in rich_text)
+
+
+def fragments_for_annotations(annotations: Dict[str, Any]) -> Tuple[str, str]:
+    flags = tuple(bool(annotations.get(name)) for name in ANNOTATION_NAMES)
+    return annotation_fragments(flags, annotations.get('color') or 'default')
+
+
+def render_span(span: Dict[str, Any]) -> str:
+    """HTML одного фрагмента rich_text"""
+    if span.get('type') == 'equation':
+        expression = (span.get('equation') or {}).get('expression') or span_text(span)
+        return f'<span class="notion-equation">{escape_text(expression)}</span>'
+
+    text = span.get('plain_text')
+    html = escape_text(text if text is not None else span_text(span))
+
+    annotations = span.get('annotations')
+    if annotations:
+        fragments = fragments_for_annotations(annotations)
+        # Быстрый путь: у большинства фрагментов нет ни аннотаций, ни цвета
+        if fragments is not PLAIN:
+            html = fragments[0] + html + fragments[1]
+
+    # href есть у ссылок и упоминаний страниц; у text-фрагментов ссылка может лежать в text.link
+    href = span.get('href')
+    if href is None and span.get('type', 'text') == 'text':
+        link = (span.get('text') or {}).get('link')
+        href = link.get('url') if link else None
+    if href:
+        html = f'<a href="{escape(href)}">{html}</a>'
+    return html
+
+
+def render_rich_text(rich_text: List[Dict[str, Any]]) -> str:
+    """Превращает массив rich_text Notion в экранированный HTML с аннотациями и ссылками"""
+    if len(rich_text) == 1:
+        return render_span(rich_text[0])
+    return ''.join([render_span(span) for span in rich_text])
@@ -0,0 +1,135 @@
+import re
+import json
+import hashlib
+import logging
+from functools import lru_cache
+from collections import defaultdict
+from typing import List, Dict, Any, Iterator, Tuple
+from document import Document, Node, HEADING_TYPES
+
+SEARCH_PREFIX = 'search'
+TOKEN_RE = re.compile(r'[^\W_]+')
+MIN_TOKEN_LENGTH = 2
+# Веса вхождений: совпадение в заголовке важнее, чем в тексте
+TITLE_WEIGHT = 5
+HEADING_WEIGHT = 3
+TEXT_WEIGHT = 1
+
+# Лёгкий стеммер: отрезается первое подходящее окончание, если остаётся хотя бы MIN_STEM_LENGTH символов.
+# Правила попадают в manifest.json, поэтому search.js нормализует запросы точно так же.
+MIN_STEM_LENGTH = 3
+SUFFIXES = sorted((
+    'ations', 'ation', 'ness', 'ment', 'ings', 'ing', 'ies', 'ied', 'ers', 'er', 'ed', 'es', 'ly', 's',
+    'ами', 'ями', 'ого', 'его', 'ому', 'ему', 'ыми', 'ими', 'ов', 'ев', 'ах', 'ях', 'ам', 'ям', 'ой', 'ей',
+    'ий', 'ый', 'ая', 'яя', 'ое', 'ее', 'ые', 'ие', 'ом', 'ем', 'ую', 'юю', 'ть', 'а', 'я', 'о', 'е', 'ы',
+    'и', 'у', 'ю', 'ь',
+), key=len, reverse=True)
+STOP_WORDS = frozenset((
+    'the', 'and', 'for', 'are', 'but', 'not', 'you', 'with', 'this', 'that', 'from', 'was', 'have', 'has',
+    'its', 'of', 'to', 'in', 'on', 'is', 'it', 'be', 'as', 'at', 'by', 'or', 'an',
+    'и', 'в', 'во', 'не', 'что', 'он', 'на', 'я', 'с', 'со', 'как', 'а', 'то', 'все', 'она', 'так', 'его',
+    'но', 'да', 'ты', 'к', 'у', 'же', 'вы', 'за', 'бы', 'по', 'от', 'из', 'о', 'для', 'это', 'или', 'ли',
+))
+
+
+@lru_cache(maxsize=65536)
+def stem(word: str) -> str:
+    for suffix in SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= MIN_STEM_LENGTH:
+            return word[:-len(suffix)]
+    return word
+
+
+def tokenize(text: str) -> Iterator[str]:
+    """Нормализованные термы текста: нижний регистр, ё -> е, без стоп-слов, со стеммингом"""
+    for word in TOKEN_RE.findall(text.lower().replace('ё', 'е')):
+        if len(word) >= MIN_TOKEN_LENGTH and word not in STOP_WORDS:
+            yield stem(word)
+
+
+class SearchIndex:
+    """Инвертированный индекс по разделам страниц, шардированный по префиксу терма"""
+
+    def __init__(self, prefix_length: int = 2, docs_per_chunk: int = 500):
+        self.prefix_length = prefix_length
+        self.docs_per_chunk = docs_per_chunk
+        # Документ — раздел страницы: (url, заголовок)
+        self.docs: List[Tuple[str, str]] = []
+        # терм -> {doc_id: вес}
+        self.postings: Dict[str, Dict[int, int]] = defaultdict(dict)
+
+    def add_page(self, filename: str, title: str, document: Document):
+        """Индексирует страницу: текст до первого заголовка и каждый раздел под заголовком"""
+        doc_id = self.add_doc(f"{filename}.html", title, title, TITLE_WEIGHT)
+        for node, is_heading in self.walk(document.nodes):
+            if is_heading:
+                doc_id = self.add_doc(f"{filename}.html#{node.props['anchor']}", f"{title} — {node.text}",
+                                      node.text, HEADING_WEIGHT)
+            else:
+                self.add_text(doc_id, node.text, TEXT_WEIGHT)
+                self.add_text(doc_id, node.props.get('caption_text', ''), TEXT_WEIGHT)
+
+    @staticmethod
+    def walk(nodes: List[Node]) -> Iterator[Tuple[Node, bool]]:
+        stack = list(reversed(nodes))
+        while stack:
+            node = stack.pop()
+            yield node, node.type in HEADING_TYPES
+            stack.extend(reversed(node.children))
+
+    def add_doc(self, url: str, title: str, text: str, weight: int) -> int:
+        doc_id = len(self.docs)
+        self.docs.append((url, title))
+        self.add_text(doc_id, text, weight)
+        return doc_id
+
+    def add_text(self, doc_id: int, text: str, weight: int):
+        if not text:
+            return
+        for term in tokenize(text):
+            postings = self.postings[term]
+            postings[doc_id] = postings.get(doc_id, 0) + weight
+
+    def shard_key(self, term: str) -> str:
+        # Имя шарда — hex префикса в UTF-8, чтобы кириллица не попадала в URL
+        return term[:self.prefix_length].encode('utf-8').hex()
+
+    @staticmethod
+    def dump(data: Any) -> bytes:
+        return json.dumps(data, ensure_ascii=False, separators=(',', ':'), sort_keys=True).encode('utf-8')
+
+    def emit(self, file_manager, kind: str, name: str, data: Any) -> str:
+        """Пишет неизменяемый файл индекса с хэшем содержимого в имени"""
+        payload = self.dump(data)
+        rel_path = f"{SEARCH_PREFIX}/{kind}/{name}.{hashlib.sha256(payload).hexdigest()[:8]}.json"
+        file_manager.save_bytes(rel_path, payload)
+        return rel_path[len(SEARCH_PREFIX) + 1:]
+
+    def write(self, file_manager) -> Dict[str, int]:
+        """Сохраняет шарды, чанки документов и manifest.json в build/search"""
+        shards: Dict[str, Dict[str, List[int]]] = defaultdict(dict)
+        for term, postings in self.postings.items():
+            # Плоский список [doc_id, вес, doc_id, вес, ...], по убыванию веса
+            ranked = sorted(postings.items(), key=lambda item: (-item[1], item[0]))
+            shards[self.shard_key(term)][term] = [value for pair in ranked for value in pair]
+
+        manifest = {
+            'version': 1,
+            'prefix_length': self.prefix_length,
+            'min_token_length': MIN_TOKEN_LENGTH,
+            'min_stem_length': MIN_STEM_LENGTH,
+            'suffixes': SUFFIXES,
+            'stop_words': sorted(STOP_WORDS),
+            'docs_per_chunk': self.docs_per_chunk,
+            'docs': [
+                self.emit(file_manager, 'docs', str(index // self.docs_per_chunk),
+                          self.docs[index:index + self.docs_per_chunk])
+                for index in range(0, len(self.docs), self.docs_per_chunk)
+            ],
+            'shards': {key: self.emit(file_manager, 'shards', key, terms) for key, terms in sorted(shards.items())},
+        }
+        file_manager.save_bytes(f"{SEARCH_PREFIX}/manifest.json", self.dump(manifest))
+
+        stats = {'docs': len(self.docs), 'terms': len(self.postings), 'shards': len(shards)}
+        logging.info(f"Search index: {stats}")
+        return stats
@@ -1,26 +1,87 @@
-from jinja2 import Environment, FileSystemLoader
-import yaml
-from pathlib import Path
-
-class TemplateEngine:
-    def __init__(self, templates_dir: str = 'templates', config_dir: str = 'config'):
-        self.env = Environment(loader=FileSystemLoader(templates_dir))
-        self.load_config(config_dir)
-
-    def load_config(self, config_dir: str):
-        config_path = Path(config_dir) / 'styles.yaml'
-        with open(config_path, 'r', encoding='utf-8') as f:
-            self.config = yaml.safe_load(f)
-
-    def render_block(self, block_type: str, **kwargs) -> str:
-        """Рендерит HTML для конкретного типа блока"""
-        template = self.env.get_template(f'blocks/{block_type}.html')
-        return template.render(
-            classes=self.config['classes'],
-            **kwargs
-        )
-
-    def render_page(self, template_name: str, **kwargs) -> str:
-        """Рендерит целую страницу"""
-        template = self.env.get_template(template_name)
-        return template.render(**kwargs)
\ No newline at end of file
+from jinja2 import Environment, FileSystemLoader, FileSystemBytecodeCache, Template
+import time
+import yaml
+from pathlib import Path
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+from metrics import metrics
+
+class TemplateEngine:
+    def __init__(self, templates_dir: str = 'templates', config_dir: str = 'config',
+                 bytecode_cache_dir: Optional[str] = None):
+        bytecode_cache = None
+        if bytecode_cache_dir:
+            Path(bytecode_cache_dir).mkdir(parents=True, exist_ok=True)
+            bytecode_cache = FileSystemBytecodeCache(bytecode_cache_dir)
+
+        # Шаблоны не меняются во время сборки, поэтому не проверяем mtime на каждом get_template
+        self.env = Environment(loader=FileSystemLoader(templates_dir), auto_reload=False,
+                               bytecode_cache=bytecode_cache)
+        self.load_config(config_dir)
+        # Исходный путь asset -> путь с хэшем (заполняется AssetPipeline)
+        self.asset_urls: Dict[str, str] = {}
+        self.env.globals['asset_url'] = lambda path: self.asset_urls.get(path, path)
+        self.block_templates = self.compile_block_templates()
+        # (тип блока, ключи контекста) -> шаблон-цикл для пакетного рендеринга
+        self.batch_templates: Dict[Tuple[str, Tuple[str, ...]], Template] = {}
+
+    def load_config(self, config_dir: str):
+        config_path = Path(config_dir) / 'styles.yaml'
+        with open(config_path, 'r', encoding='utf-8') as f:
+            self.config = yaml.safe_load(f)
+
+    def compile_block_templates(self) -> Dict[str, Template]:
+        """Компилирует все шаблоны блоков один раз при старте"""
+        templates = {}
+        for name in self.env.list_templates(extensions=['html']):
+            if name.startswith('blocks/'):
+                templates[name[len('blocks/'):-len('.html')]] = self.env.get_template(name)
+        return templates
+
+    def get_block_template(self, block_type: str) -> Template:
+        template = self.block_templates.get(block_type)
+        if template is None:
+            template = self.block_templates[block_type] = self.env.get_template(f'blocks/{block_type}.html')
+        return template
+
+    def render_block(self, block_type: str, **kwargs) -> str:
+        """Рендерит HTML для конкретного типа блока"""
+        return self.get_block_template(block_type).render(
+            classes=self.config['classes'],
+            **kwargs
+        )
+
+    def get_batch_template(self, block_type: str, keys: Tuple[str, ...]) -> Template:
+        """Шаблон блока, встроенный в цикл по items: переменные блока берутся из item"""
+        template = self.batch_templates.get((block_type, keys))
+        if template is None:
+            source = self.env.loader.get_source(self.env, f'blocks/{block_type}.html')[0]
+            # Как при загрузке из файла: завершающий перевод строки шаблона не выводится
+            if source.endswith('\n'):
+                source = source[:-2] if source.endswith('\r\n') else source[:-1]
+            if keys:
+                assignments = ', '.join(f"{key}=item['{key}']" for key in keys)
+                source = f"{{% with {assignments} %}}{source}{{% endwith %}}"
+            template = self.batch_templates[(block_type, keys)] = self.env.from_string(
+                "{% for item in items %}{% if not loop.first %}{{ separator }}{% endif %}"
+                + source + "{% endfor %}")
+        return template
+
+    def render_blocks(self, block_type: str, items: List[Dict[str, Any]], separator: str = '') -> str:
+        """Рендерит однотипные блоки одним вызовом шаблона; у всех items одинаковые ключи"""
+        if not items:
+            return ''
+        return self.get_batch_template(block_type, tuple(items[0])).render(
+            items=items, separator=separator, classes=self.config['classes'])
+
+    def render_page(self, template_name: str, **kwargs) -> str:
+        """Рендерит целую страницу"""
+        template = self.env.get_template(template_name)
+        started = time.perf_counter()
+        html = template.render(**kwargs)
+        metrics.observe('template.render_page_seconds', time.perf_counter() - started)
+        return html
+
+    def stream_page(self, template_name: str, **kwargs) -> Iterator[str]:
+        """Рендерит страницу по частям, не собирая её целиком в памяти"""
+        template = self.env.get_template(template_name)
+        return template.generate(**kwargs)
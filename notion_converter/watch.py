@@ -0,0 +1,146 @@
+import os
+import time
+import logging
+import subprocess
+import requests
+from datetime import datetime, timezone, timedelta
+from typing import List, Dict, Any, Optional, Set
+from notion_client import NotionClient, SETTLE_SECONDS, parse_time
+from main import load_settings, create_client, fetch_site, build_site, attach_document
+from metrics import metrics
+
+def format_time(value: datetime) -> str:
+    return value.strftime('%Y-%m-%dT%H:%M:%S.000Z')
+
+
+def page_key(page_id: str) -> str:
+    return page_id.replace('-', '')
+
+
+class Watcher:
+    """Опрашивает /search и пересобирает только изменённые страницы.
+
+    Документы всех страниц держатся в памяти между опросами, поэтому неизменённые страницы
+    не требуют ни запросов к API, ни повторного рендеринга.
+    """
+
+    def __init__(self, settings: Dict[str, Any], notion_client: NotionClient, interval: float = 30.0,
+                 command: Optional[str] = None):
+        self.settings = settings
+        self.notion_client = notion_client
+        self.interval = interval
+        # Команда после каждой пересборки (например, публикация build)
+        self.command = command
+        self.pages: List[Dict[str, Any]] = []
+        self.watermark: Optional[str] = None
+
+    @staticmethod
+    def track(page: Dict[str, Any]) -> Dict[str, Any]:
+        """Запоминает вложенные страницы и базы: их изменение меняет структуру сайта"""
+        page['links'] = NotionClient.find_child_pages(page['blocks'])
+        return attach_document(page)
+
+    def full_build(self):
+        logging.info("Watch: full build")
+        self.pages = fetch_site(self.notion_client, self.settings, transform=self.track)
+        edited = [page['last_edited_time'] for page in self.pages if page.get('last_edited_time')]
+        self.watermark = max(edited + [self.watermark or ''])
+        self.rebuild(None)
+
+    def rebuild(self, render_only: Optional[Set[str]]):
+        metrics.reset()
+        build_site(self.settings, self.pages, render_only=render_only, keep_documents=True)
+        if self.settings['metrics_path']:
+            metrics.write_report(self.settings['metrics_path'])
+        if self.command:
+            logging.info(f"Watch: running {self.command}")
+            subprocess.run(self.command, shell=True, check=False)
+
+    def known_parents(self) -> Set[str]:
+        """id страниц и баз данных сайта: новая страница под ними требует повторного обхода"""
+        parents = {page_key(page['id']) for page in self.pages}
+        for page in self.pages:
+            parents.update(page_key(object_id) for kind, object_id in page['links'] if kind == 'child_database')
+        return parents
+
+    def poll(self) -> bool:
+        """Один опрос; возвращает True, если сайт был пересобран"""
+        now = datetime.now(timezone.utc)
+        since = format_time(parse_time(self.watermark) - timedelta(seconds=SETTLE_SECONDS)) if self.watermark else None
+        results = self.notion_client.search_pages(since)
+        if results:
+            # Результаты отсортированы по убыванию last_edited_time
+            self.watermark = max(self.watermark or '', results[0]['last_edited_time'])
+
+        pages_by_key = {page_key(page['id']): index for index, page in enumerate(self.pages)}
+        discovery = bool(self.settings['root_ids'])
+        structure_changed = False
+        changed = []
+        for page_data in results:
+            index = pages_by_key.get(page_key(page_data['id']))
+            if index is None:
+                parent = page_data.get('parent') or {}
+                parent_id = parent.get('page_id') or parent.get('database_id')
+                if discovery and parent_id and page_key(parent_id) in self.known_parents():
+                    logging.info(f"Watch: new page {page_data['id']}")
+                    structure_changed = True
+                continue
+            edited = page_data.get('last_edited_time')
+            settling = bool(edited) and (now - parse_time(edited)).total_seconds() < SETTLE_SECONDS
+            if edited != self.pages[index]['last_edited_time'] or settling:
+                changed.append((index, page_data, settling))
+
+        if structure_changed:
+            self.full_build()
+            return True
+        if not changed:
+            return False
+
+        render_only = set()
+        titles_changed = False
+        for index, page_data, settling in changed:
+            previous = self.pages[index]
+            page = self.track(self.notion_client.fetch_page(previous['id'], page_data, refresh=settling))
+            page['parent'] = previous.get('parent')
+            page['depth'] = previous.get('depth')
+            titles_changed |= page['title'] != previous['title']
+            structure_changed |= discovery and set(page['links']) != set(previous['links'])
+            self.pages[index] = page
+            render_only.add(page['id'])
+
+        if structure_changed:
+            self.full_build()
+            return True
+        # Смена заголовка меняет навигацию (а в режиме обхода — и имена файлов) на всех страницах
+        logging.info(f"Watch: {len(render_only)} page(s) changed"
+                     f"{', title changed: rendering all pages' if titles_changed else ''}")
+        self.rebuild(None if titles_changed else render_only)
+        return True
+
+    def run(self):
+        self.full_build()
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.poll()
+            except requests.RequestException as e:
+                # Сбой сети или API не останавливает наблюдение: повторим на следующем опросе
+                logging.error(f"Watch: poll failed: {e}")
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    settings = load_settings()
+    notion_client = create_client(settings)
+    watcher = Watcher(settings, notion_client, interval=float(os.getenv('NOTION_WATCH_INTERVAL', '30')),
+                      command=os.getenv('NOTION_WATCH_COMMAND'))
+    try:
+        watcher.run()
+    except KeyboardInterrupt:
+        logging.info("Watch stopped")
+    finally:
+        notion_client.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -23,6 +23,11 @@ headers = {
     "Notion-Version": "2022-06-28"
 }
 
+# Одна keep-alive сессия на все запросы к API вместо нового соединения на каждый вызов
+session = requests.Session()
+session.headers.update(headers)
+REQUEST_TIMEOUT = (5, 30)
+
 def get_notion_content(page_id):
     notion_api_url = f"https://api.notion.com/v1/blocks/{page_id}/children"
     all_blocks = []
@@ -35,7 +40,7 @@ def get_notion_content(page_id):
             if start_cursor:
                 params["start_cursor"] = start_cursor
 
-            response = requests.get(notion_api_url, headers=headers, params=params)
+            response = session.get(notion_api_url, params=params, timeout=REQUEST_TIMEOUT)
             response.raise_for_status()
             data = response.json()
 
@@ -52,14 +57,11 @@ def get_notion_content(page_id):
     return all_blocks
 
 def get_text_content(rich_text):
-    return ''.join([t.get('plain_text', '') for t in rich_text])
+    # Сырой текст: plain_text есть у всех типов фрагментов (text, mention, equation)
+    return ''.join([t.get('plain_text') or t.get('text', {}).get('content', '') for t in rich_text])
 
-def get_text_content(rich_text):
-    return ''.join([part['text']['content'] for part in rich_text])
-
-def get_child_blocks(block_id):
-    # Ваша реализация получения дочерних блоков
-    pass
+def get_html_content(rich_text):
+    return escape(get_text_content(rich_text), quote=False)
 
 def convert_to_html(blocks):
     html_content = []
@@ -69,15 +71,15 @@ def convert_to_html(blocks):
         block_type = block.get('type')
 
         if block_type == 'paragraph':
-            text = get_text_content(block['paragraph'].get('rich_text', []))
+            text = get_html_content(block['paragraph'].get('rich_text', []))
             html_content.append(f"<p>{text}</p>")
 
         elif block_type.startswith('heading_'):
             level = int(block_type.split('_')[-1])
             text = get_text_content(block[block_type].get('rich_text', []))
-            heading_id = text.replace(" ", "-").lower()
+            heading_id = escape(text.replace(" ", "-").lower())
             html_content.append(f"<hr class='major' />")
-            html_content.append(f"<h{level} id='{heading_id}' class='heading-level-{level}'>{text}</h{level}>")
+            html_content.append(f"<h{level} id='{heading_id}' class='heading-level-{level}'>{escape(text)}</h{level}>")
             html_content.append(f"<hr class='major' />")
 
         elif block_type in ['bulleted_list_item', 'numbered_list_item']:
@@ -87,7 +89,7 @@ def convert_to_html(blocks):
                     html_content.append(f"</{list_type}>")
                 html_content.append(f"<{current_list}>")
                 list_type = current_list
-            text = get_text_content(block[block_type].get('rich_text', []))
+            text = get_html_content(block[block_type].get('rich_text', []))
             html_content.append(f"<li>{text}</li>")
 
         elif block_type == 'code':
@@ -112,12 +114,12 @@ def convert_to_html(blocks):
             html_content.append("<hr>")
 
         elif block_type == 'quote':
-            text = get_text_content(block['quote'].get('rich_text', []))
+            text = get_html_content(block['quote'].get('rich_text', []))
             html_content.append(f"<blockquote>{text}</blockquote>")
 
         elif block_type == 'callout':
             icon = block['callout']['icon'].get('emoji', '') if block['callout']['icon'].get('type') == 'emoji' else ''
-            text = get_text_content(block['callout'].get('rich_text', []))
+            text = get_html_content(block['callout'].get('rich_text', []))
             html_content.append(f"<div class='callout'>{icon} {text}</div>")
 
         # Обработка дочерних блоков
@@ -132,11 +134,9 @@ def convert_to_html(blocks):
 
 
 def get_child_blocks(block_id):
-    url = f"https://api.notion.com/v1/blocks/{block_id}/children"
+    # Та же пагинация, что и для страницы: иначе теряются блоки после первых 100
     try:
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()
-        return response.json().get('results', [])
+        return get_notion_content(block_id)
     except requests.RequestException as e:
         logging.error(f"Error fetching child blocks: {e}")
         return []
@@ -144,7 +144,7 @@ def get_child_blocks(block_id):
 def get_title(page_id):
     try:
         url = f"https://api.notion.com/v1/pages/{page_id}"
-        response = requests.get(url, headers=headers)
+        response = session.get(url, timeout=REQUEST_TIMEOUT)
         response.raise_for_status()
         page_data = response.json()
 
@@ -165,19 +165,14 @@ def generate_toc(blocks):
     for block in blocks:
         if block.get('type') == 'heading_1':
             text = get_text_content(block['heading_1'].get('rich_text', []))
-            heading_id = text.replace(" ", "-").lower()
-            toc_item = f"<li><a href='#{heading_id}'>{text}</a></li>"
+            heading_id = escape(text.replace(" ", "-").lower())
+            toc_item = f"<li><a href='#{heading_id}'>{escape(text)}</a></li>"
             toc.append(toc_item)
 
     # Wrap in the main <ul> list
     return "<ul>" + ''.join(toc) + "</ul>"
 
 
-def get_text_content(rich_text):
-    # Function to extract text from rich_text
-    return ' '.join([item['text']['content'] for item in rich_text])
-
-
 def generate_navigation(pages_data):
     nav_html = ""
     for i, (title, filename) in enumerate(pages_data):
@@ -214,23 +209,20 @@ def main():
 
         template = load_template()
         pages_data = []
+        rendered_pages = []
         for idx, page_id in enumerate(NOTION_PAGE_IDS):
             logging.info(f"Processing page {page_id}")
             notion_content = get_notion_content(page_id)
-            html_content = convert_to_html(notion_content)
             title = get_title(page_id)
-            toc = generate_toc(notion_content)
 
             filename = 'index' if idx == 0 else f'page_{idx + 1}'
             pages_data.append((title, filename))
-            save_html(toc, html_content, title, filename, '', template)
+            rendered_pages.append((convert_to_html(notion_content), generate_toc(notion_content)))
 
+        # Каждый файл пишется один раз, когда навигация уже известна
         navigation = generate_navigation(pages_data)
 
-        for title, filename in pages_data:
-            notion_content = get_notion_content(NOTION_PAGE_IDS[pages_data.index((title, filename))])
-            html_content = convert_to_html(notion_content)
-            toc = generate_toc(notion_content)
+        for (title, filename), (html_content, toc) in zip(pages_data, rendered_pages):
             save_html(toc, html_content, title, filename, navigation, template)
 
         logging.info("Sync completed successfully")
@@ -0,0 +1,49 @@
+"""Проверки NotionClient на локальной замене Notion API (benchmarks/mock_notion.py)"""
+import sys
+import time
+import unittest
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT / 'notion_converter'))
+sys.path.insert(0, str(REPO_ROOT / 'benchmarks'))
+
+from notion_client import NotionClient, TokenBucket
+from mock_notion import Workspace, MockNotionServer
+
+
+class TokenBucketTest(unittest.TestCase):
+    def test_pause_not_shortened_by_response_time(self):
+        bucket = TokenBucket(rate=2.0)
+        bucket.acquire()
+        # Ответ с 429 пришёл позже, чем длится Retry-After
+        time.sleep(0.6)
+        bucket.pause(0.5)
+        started = time.monotonic()
+        bucket.acquire()
+        self.assertGreaterEqual(time.monotonic() - started, 0.45)
+
+
+class RetryAfterTest(unittest.TestCase):
+    def test_slow_429_response_keeps_full_pause(self):
+        latency, retry_after = 1.2, 1.0
+        workspace = Workspace(pages=1, blocks_per_page=5, depth=1)
+        with MockNotionServer(workspace, latency=latency, rate_limit_every=2, retry_after=retry_after) as server:
+            client = NotionClient('test', requests_per_second=2.0, backoff_base=0.01, base_url=f"{server.url}/v1")
+            try:
+                page_id = workspace.page_ids[0]
+                client.get_page(page_id)
+                client.get_page_content(page_id)
+            finally:
+                client.close()
+            events = list(server.events)
+
+        self.assertEqual(client.stats['retries'], 1)
+        limited_at = next(at for at, kind in events if kind == 'rate_limited')
+        retried_at = next(at for at, kind in events if kind == 'request' and at > limited_at)
+        # Событие запроса пишется после задержки ответа замены API
+        self.assertGreaterEqual(retried_at - limited_at, retry_after + latency * 0.9)
+
+
+if __name__ == '__main__':
+    unittest.main()